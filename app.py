@@ -1,150 +1,180 @@
-from flask import Flask, render_template, jsonify, request, session, Blueprint, redirect
+from flask import Flask, Response, render_template, jsonify, request, session, Blueprint, redirect
+from flask.json.provider import DefaultJSONProvider
+import json
+import re
 import uuid
-import random
 import copy
 import os
+import hashlib
+import secrets
+import time
+
+from game_store import ShardedGameStore
+from leaderboard import LeaderboardStore, SQLiteLeaderboardStore, board_key, clean_name
+from race import RaceHub
+from scheduler import GenerationScheduler, GenerationBusy
+from sudoku import (SudokuPuzzle, analyze_puzzle, parse_board, canonical_hash, encode_board, parse_variant,
+                    BloomFilter, BOARD_ENCODINGS, VARIANTS)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Compact JSON for jsonify (orjson when installed)
+    def dumps(self, obj, **kwargs):
+        if orjson is not None:
+            return orjson.dumps(obj).decode()
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
 
 # Flask app setup
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'vercel-sudoku-secret-key-2024')
 
-# Game sessions storage
-games = {}
+# Game sessions storage (thread-safe, per-game locking)
+# SUDOKU_DB_PATH enables the SQLite backend shared by all worker processes
+# SUDOKU_CHECKPOINT_PATH keeps in-memory games across restarts (changed games only)
+# Optional backends are imported only when configured to keep cold starts short
+if os.environ.get('SUDOKU_DB_PATH'):
+    from sqlite_store import SQLiteGameStore
+    games = SQLiteGameStore(os.environ['SUDOKU_DB_PATH'], SudokuPuzzle)
+elif os.environ.get('SUDOKU_CHECKPOINT_PATH'):
+    from checkpoint import GameCheckpoint
+    games = ShardedGameStore(
+        checkpoint=GameCheckpoint(os.environ['SUDOKU_CHECKPOINT_PATH'], SudokuPuzzle),
+        checkpoint_interval=float(os.environ.get('SUDOKU_CHECKPOINT_INTERVAL', '5')))
+else:
+    games = ShardedGameStore()
 
-# Sudoku classes (embedded to avoid import issues)
-class SudokuGenerator:
-    def __init__(self):
-        self.board = [[0 for _ in range(9)] for _ in range(9)]
-        
-    def is_valid(self, board, row, col, num):
-        # Check row
-        for x in range(9):
-            if board[row][x] == num:
-                return False
-        
-        # Check column  
-        for x in range(9):
-            if board[x][col] == num:
-                return False
-        
-        # Check 3x3 box
-        start_row = row - row % 3
-        start_col = col - col % 3
-        for i in range(3):
-            for j in range(3):
-                if board[i + start_row][j + start_col] == num:
-                    return False
-        
-        return True
-    
-    def solve_board(self, board):
-        for i in range(9):
-            for j in range(9):
-                if board[i][j] == 0:
-                    for num in range(1, 10):
-                        if self.is_valid(board, i, j, num):
-                            board[i][j] = num
-                            if self.solve_board(board):
-                                return True
-                            board[i][j] = 0
-                    return False
-        return True
-    
-    def generate_complete_board(self):
-        self.board = [[0 for _ in range(9)] for _ in range(9)]
-        self.fill_diagonal()
-        self.solve_board(self.board)
-        return self.board
-    
-    def fill_diagonal(self):
-        for box in range(0, 9, 3):
-            self.fill_box(box, box)
-    
-    def fill_box(self, row, col):
-        numbers = list(range(1, 10))
-        random.shuffle(numbers)
-        
-        for i in range(3):
-            for j in range(3):
-                self.board[row + i][col + j] = numbers.pop()
-
-class SudokuPuzzle:
-    def __init__(self):
-        self.generator = SudokuGenerator()
-        self.complete_board = None
-        self.puzzle_board = None
-        self.user_board = None
-        
-    def create_puzzle(self, difficulty="medium"):
-        self.complete_board = self.generator.generate_complete_board()
-        self.puzzle_board = copy.deepcopy(self.complete_board)
-        
-        cells_to_remove = self.get_cells_to_remove(difficulty)
-        self.remove_cells(cells_to_remove)
-        
-        self.user_board = copy.deepcopy(self.puzzle_board)
-        return self.puzzle_board
-    
-    def get_cells_to_remove(self, difficulty):
-        difficulty_levels = {
-            "easy": 30,
-            "medium": 45,
-            "hard": 55
-        }
-        return difficulty_levels.get(difficulty, 45)
-    
-    def remove_cells(self, cells_to_remove):
-        positions = [(i, j) for i in range(9) for j in range(9)]
-        random.shuffle(positions)
-        
-        for i in range(cells_to_remove):
-            row, col = positions[i]
-            self.puzzle_board[row][col] = 0
-    
-    def make_move(self, row, col, num):
-        if 1 <= row <= 9 and 1 <= col <= 9 and 1 <= num <= 9:
-            if self.puzzle_board[row-1][col-1] != 0:
-                return False, "このセルは変更できません"
-            
-            self.user_board[row-1][col-1] = num
-            return True, "手が記録されました"
-        else:
-            return False, "無効な入力です"
-    
-    def clear_cell(self, row, col):
-        if 1 <= row <= 9 and 1 <= col <= 9:
-            if self.puzzle_board[row-1][col-1] != 0:
-                return False, "このセルは変更できません"
-            
-            self.user_board[row-1][col-1] = 0
-            return True, "セルがクリアされました"
-        else:
-            return False, "無効な入力です"
+def board_encoding():
+    # Board encoding from ?encoding= or the X-Board-Encoding header (json / string / packed)
+    encoding = request.args.get('encoding') or request.headers.get('X-Board-Encoding', 'json')
+    return encoding if encoding in BOARD_ENCODINGS else 'json'
+
+# Gameplay event log (enabled by SUDOKU_EVENT_LOG_DIR)
+if os.environ.get('SUDOKU_EVENT_LOG_DIR'):
+    from event_log import EventLog
+    event_log = EventLog(os.environ['SUDOKU_EVENT_LOG_DIR'])
+else:
+    event_log = None
+
+def log_event(event, **fields):
+    if event_log is not None:
+        event_log.log(event, **fields)
+
+# Solve-time leaderboards: shared by all workers in SUDOKU_DB_PATH when set,
+# otherwise saved to SUDOKU_LEADERBOARD_DIR (single process only)
+if os.environ.get('SUDOKU_DB_PATH'):
+    leaderboards = SQLiteLeaderboardStore(os.environ['SUDOKU_DB_PATH'])
+else:
+    leaderboards = LeaderboardStore(os.environ.get('SUDOKU_LEADERBOARD_DIR'))
+LEADERBOARD_DIFFICULTIES = ('easy', 'medium', 'hard', 'expert', 'extreme')
+MAX_LEADERBOARD_LIMIT = 100
+DAILY_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def today():
+    # Daily puzzles change at midnight UTC
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+def record_solve(puzzle):
+    # The first correct check goes on the difficulty board (and the daily board)
+    # Games that were sent the solution (or its per-cell hashes) are never ranked
+    if (puzzle.recorded or puzzle.solve_time_ms is None or puzzle.validation != 'server'
+            or puzzle.difficulty not in LEADERBOARD_DIFFICULTIES):
+        return []
+    puzzle.recorded = True
     
-    def check_solution(self):
-        for i in range(9):
-            for j in range(9):
-                if self.user_board[i][j] == 0:
-                    return False, "まだ空欄があります"
-        
-        if self.user_board == self.complete_board:
-            return True, "正解です！おめでとうございます！"
-        else:
-            return False, "間違いがあります。再度確認してください。"
+    keys = [board_key(puzzle.difficulty, puzzle.variant.name)]
+    if puzzle.daily:
+        keys.append(board_key(puzzle.difficulty, puzzle.variant.name, puzzle.daily))
     
-    def get_hint(self):
-        empty_cells = []
-        for i in range(9):
-            for j in range(9):
-                if self.user_board[i][j] == 0:
-                    empty_cells.append((i, j))
-        
-        if empty_cells:
-            row, col = random.choice(empty_cells)
-            correct_num = self.complete_board[row][col]
-            return f"ヒント: 行{row+1}, 列{col+1}に{correct_num}が入ります"
-        else:
-            return "ヒントは不要です - 盤面が埋まっています"
+    ranks = []
+    entries = dict(session.get('entries', {}))
+    for key in keys:
+        entry_id, rank, total = leaderboards.record(key, puzzle.solve_time_ms, session.get('name'))
+        entries.pop(key, None)
+        entries[key] = entry_id
+        ranks.append({'board': key, 'rank': rank, 'total': total, 'time_ms': puzzle.solve_time_ms})
+    # Keep the session cookie small: only the most recent boards
+    session['entries'] = dict(list(entries.items())[-10:])
+    return ranks
+
+# Puzzle generation runs through a bounded, prioritized queue
+scheduler = GenerationScheduler(
+    workers=int(os.environ.get('SUDOKU_GENERATION_WORKERS', '2')),
+    max_queue=int(os.environ.get('SUDOKU_GENERATION_QUEUE', '64')))
+
+def busy_response(busy):
+    # 503 + Retry-After so clients back off instead of timing out
+    response = jsonify({'success': False, 'busy': True, 'error': str(busy), 'retry_after': busy.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(busy.retry_after)
+    return response
+
+# On-demand request profiling: SUDOKU_PROFILE_TOKEN profiles requests sent with a matching
+# X-Profile-Token header, SUDOKU_PROFILE_SAMPLE_RATE profiles a random fraction of requests.
+# Sampling needs the token too (startup fails without it): profiles can only be read with it.
+# The middleware is installed only when configured, so it costs nothing otherwise
+if os.environ.get('SUDOKU_PROFILE_TOKEN') or os.environ.get('SUDOKU_PROFILE_SAMPLE_RATE'):
+    from profiler import RequestProfiler, ProfilerMiddleware
+    profiler = RequestProfiler(
+        token=os.environ.get('SUDOKU_PROFILE_TOKEN'),
+        sample_rate=float(os.environ.get('SUDOKU_PROFILE_SAMPLE_RATE', '0')),
+        capacity=int(os.environ.get('SUDOKU_PROFILE_CAPACITY', '20')),
+        skip_prefixes=('/game/profiles', '/static'),
+        # Race event streams never end, so they are never profiled
+        skip_suffixes=('/events',))
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, profiler)
+else:
+    profiler = None
+
+def profiling():
+    # cProfile only sees the request thread
+    return profiler is not None and request.environ.get(profiler.environ_key, False)
+
+def profiler_access():
+    # Error response unless profiling is enabled and the admin token matches
+    if profiler is None:
+        return jsonify({'success': False, 'error': 'プロファイルは無効です'}), 404
+    if not profiler.is_admin(request.headers.get('X-Profile-Token')):
+        return jsonify({'success': False, 'error': '権限がありません'}), 403
+    return None
+
+def run_generation(difficulty, func, coalesce_key=None):
+    # Profiled requests generate inline so the profile sees the solver
+    if profiling():
+        return func()
+    return scheduler.run(difficulty, func, coalesce_key=coalesce_key)
+
+# Race rooms: progress is pushed over SSE, coalesced and broadcast once per tick
+# Rooms live in this process only, so race mode needs a single worker process
+races = RaceHub(tick=float(os.environ.get('SUDOKU_RACE_TICK', '0.25')))
+
+def race_progress(puzzle):
+    # Only updates room state; the broadcast happens on the next tick
+    if puzzle.race is not None:
+        room_id, player_id = puzzle.race
+        races.update(room_id, player_id, puzzle.filled_count(), puzzle.solve_time_ms)
+
+# Client-side validation modes for new_game
+VALIDATION_MODES = ('server', 'solution', 'hashed')
+
+# Upper bound for the solution count in /game/analyze
+MAX_ANALYSIS_LIMIT = 1000
+
+# How many times new_game regenerates when the puzzle was already served to the player
+MAX_REPEAT_ATTEMPTS = 5
+
+def solution_hashes(board, salt):
+    # Per-cell salted hashes so the client can check moves without seeing the answer
+    hashes = []
+    for i in range(9):
+        for j in range(9):
+            cell = f"{salt}:{i * 9 + j}:{board[i][j]}"
+            hashes.append(hashlib.sha256(cell.encode()).hexdigest()[:16])
+    return hashes
 
 # Blueprint for /game prefix
 game_bp = Blueprint('game', __name__, url_prefix='/game')
@@ -158,21 +188,73 @@ def new_game():
     try:
         data = request.get_json()
         difficulty = data.get('difficulty', 'medium')
+        validation = data.get('validation', 'server')
+        variant = data.get('variant', 'classic')
+        encoding = board_encoding()
+        
+        if validation not in VALIDATION_MODES:
+            return jsonify({'success': False, 'error': '無効な検証モードです'})
+        if variant not in VARIANTS:
+            return jsonify({'success': False, 'error': '無効なルールです'})
+        if data.get('name'):
+            session['name'] = clean_name(data['name'])
         
-        puzzle = SudokuPuzzle()
-        puzzle.create_puzzle(difficulty)
+        seen = BloomFilter.from_base64(session.get('seen'))
+        daily = today() if data.get('daily') else None
+        seed = f"{daily}:{difficulty}:{variant}" if daily else None
+        
+        def generate():
+            puzzle = SudokuPuzzle()
+            if daily:
+                # Everyone gets the same daily puzzle for a difficulty and variant
+                puzzle.create_puzzle(difficulty, variant, seed=seed)
+                puzzle.daily = daily
+                return puzzle, canonical_hash(puzzle.puzzle_board, puzzle.variant)
+            # Skip puzzles this player has already seen (up to symmetry)
+            for _ in range(MAX_REPEAT_ATTEMPTS):
+                puzzle.create_puzzle(difficulty, variant)
+                puzzle_hash = canonical_hash(puzzle.puzzle_board, puzzle.variant)
+                if puzzle_hash not in seen:
+                    break
+            return puzzle, puzzle_hash
+        
+        # Identical seeded requests share one generation; each player gets their own copy
+        puzzle, puzzle_hash = run_generation(difficulty, generate, coalesce_key=seed)
+        if daily:
+            puzzle = copy.deepcopy(puzzle)
+        puzzle.started_at = time.time()
+        puzzle.validation = validation
+        seen.add(puzzle_hash)
         
         game_id = str(uuid.uuid4())
         games[game_id] = puzzle
         session['game_id'] = game_id
+        session['seen'] = seen.to_base64()
+        log_event('new_game', game_id=game_id, difficulty=difficulty, variant=variant, puzzle_hash=puzzle_hash)
         
-        return jsonify({
+        response = {
             'success': True,
             'game_id': game_id,
-            'puzzle': puzzle.puzzle_board,
-            'user_board': puzzle.user_board,
-            'difficulty': difficulty
-        })
+            'puzzle': encode_board(puzzle.puzzle_board, encoding),
+            'user_board': encode_board(puzzle.user_board, encoding),
+            'encoding': encoding,
+            'difficulty': difficulty,
+            'variant': puzzle.variant.to_dict(),
+            'daily': daily,
+            'validation': validation,
+            'puzzle_hash': puzzle_hash
+        }
+        
+        if validation == 'solution':
+            response['solution'] = encode_board(puzzle.complete_board, encoding)
+        elif validation == 'hashed':
+            salt = secrets.token_hex(8)
+            response['salt'] = salt
+            response['solution_hashes'] = solution_hashes(puzzle.complete_board, salt)
+        
+        return jsonify(response)
+    except GenerationBusy as busy:
+        return busy_response(busy)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -181,22 +263,26 @@ def make_move():
     try:
         data = request.get_json()
         game_id = session.get('game_id')
+        encoding = board_encoding()
         
-        if not game_id or game_id not in games:
-            return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
-        
-        puzzle = games[game_id]
-        row = int(data.get('row'))
-        col = int(data.get('col'))
-        num = int(data.get('num'))
-        
-        success, message = puzzle.make_move(row + 1, col + 1, num)
-        
-        return jsonify({
-            'success': success,
-            'message': message,
-            'user_board': puzzle.user_board
-        })
+        with games.locked(game_id) as puzzle:
+            if puzzle is None:
+                return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+            
+            row = int(data.get('row'))
+            col = int(data.get('col'))
+            num = int(data.get('num'))
+            
+            success, message = puzzle.make_move(row + 1, col + 1, num)
+            log_event('move', game_id=game_id, row=row, col=col, num=num, ok=success)
+            race_progress(puzzle)
+            
+            return jsonify({
+                'success': success,
+                'message': message,
+                'user_board': encode_board(puzzle.user_board, encoding),
+                'encoding': encoding
+            })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -205,21 +291,25 @@ def clear_cell():
     try:
         data = request.get_json()
         game_id = session.get('game_id')
+        encoding = board_encoding()
         
-        if not game_id or game_id not in games:
-            return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
-        
-        puzzle = games[game_id]
-        row = int(data.get('row'))
-        col = int(data.get('col'))
-        
-        success, message = puzzle.clear_cell(row + 1, col + 1)
-        
-        return jsonify({
-            'success': success,
-            'message': message,
-            'user_board': puzzle.user_board
-        })
+        with games.locked(game_id) as puzzle:
+            if puzzle is None:
+                return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+            
+            row = int(data.get('row'))
+            col = int(data.get('col'))
+            
+            success, message = puzzle.clear_cell(row + 1, col + 1)
+            log_event('clear', game_id=game_id, row=row, col=col, ok=success)
+            race_progress(puzzle)
+            
+            return jsonify({
+                'success': success,
+                'message': message,
+                'user_board': encode_board(puzzle.user_board, encoding),
+                'encoding': encoding
+            })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -228,17 +318,20 @@ def check_solution():
     try:
         game_id = session.get('game_id')
         
-        if not game_id or game_id not in games:
-            return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
-        
-        puzzle = games[game_id]
-        is_correct, message = puzzle.check_solution()
-        
-        return jsonify({
-            'success': True,
-            'is_correct': is_correct,
-            'message': message
-        })
+        with games.locked(game_id) as puzzle:
+            if puzzle is None:
+                return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+            
+            is_correct, message = puzzle.check_solution()
+            log_event('check', game_id=game_id, correct=is_correct)
+            race_progress(puzzle)
+            
+            return jsonify({
+                'success': True,
+                'is_correct': is_correct,
+                'message': message,
+                'ranks': record_solve(puzzle) if is_correct else []
+            })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -247,19 +340,240 @@ def get_hint():
     try:
         game_id = session.get('game_id')
         
-        if not game_id or game_id not in games:
-            return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+        with games.locked(game_id) as puzzle:
+            if puzzle is None:
+                return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+            
+            hint = puzzle.get_hint()
+            log_event('hint', game_id=game_id)
+            
+            return jsonify({
+                'success': True,
+                'hint': hint
+            })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@game_bp.route('/get_board', methods=['GET'])
+def get_board():
+    try:
+        game_id = session.get('game_id')
+        encoding = board_encoding()
+        
+        with games.locked(game_id) as puzzle:
+            if puzzle is None:
+                return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+            
+            return jsonify({
+                'success': True,
+                'puzzle_board': encode_board(puzzle.puzzle_board, encoding),
+                'user_board': encode_board(puzzle.user_board, encoding),
+                'encoding': encoding,
+                'variant': puzzle.variant.to_dict(),
+                'version': puzzle.version
+            })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@game_bp.route('/sync_board', methods=['POST'])
+def sync_board():
+    try:
+        data = request.get_json()
+        game_id = session.get('game_id')
         
-        puzzle = games[game_id]
-        hint = puzzle.get_hint()
+        with games.locked(game_id) as puzzle:
+            if puzzle is None:
+                return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+            
+            before = puzzle.user_board
+            success, message = puzzle.sync_user_board(parse_board(data.get('board')))
+            
+            response = {
+                'success': success,
+                'message': message
+            }
+            
+            # Client-validated games never call make_move, so count their moves here
+            changed = sum(1 for i in range(9) for j in range(9)
+                          if before[i][j] != puzzle.user_board[i][j]) if success else 0
+            log_event('sync', game_id=game_id, ok=success, changed=changed)
+            
+            if success and data.get('final'):
+                response['is_correct'], response['message'] = puzzle.check_solution()
+                log_event('check', game_id=game_id, correct=response['is_correct'])
+                response['ranks'] = record_solve(puzzle) if response['is_correct'] else []
+            
+            race_progress(puzzle)
+            
+            return jsonify(response)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@game_bp.route('/analyze', methods=['POST'])
+def analyze():
+    try:
+        data = request.get_json()
+        board = parse_board(data.get('board'))
+        limit = min(max(int(data.get('limit', 2)), 1), MAX_ANALYSIS_LIMIT)
+        variant = parse_variant(data.get('variant'))
+        
+        result = analyze_puzzle(board, limit, variant)
+        result['success'] = True
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@game_bp.route('/candidates', methods=['GET'])
+def candidates():
+    try:
+        game_id = session.get('game_id')
+        encoding = board_encoding()
+        
+        with games.locked(game_id) as puzzle:
+            if puzzle is None:
+                return jsonify({'success': False, 'error': 'ゲームが見つかりません'})
+            
+            masks = puzzle.get_candidates()
+            
+            return jsonify({
+                'success': True,
+                # json: 81 ints / compact encodings: 3 hex digits per cell
+                'candidates': masks if encoding == 'json' else ''.join(f'{mask:03x}' for mask in masks),
+                'encoding': encoding,
+                'version': puzzle.version
+            })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@game_bp.route('/generation_stats', methods=['GET'])
+def generation_stats():
+    return jsonify({'success': True, **scheduler.stats()})
+
+@game_bp.route('/leaderboard', methods=['GET'])
+def leaderboard():
+    try:
+        difficulty = request.args.get('difficulty', 'medium')
+        variant = request.args.get('variant', 'classic')
+        daily = request.args.get('daily')
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_LEADERBOARD_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        
+        if difficulty not in LEADERBOARD_DIFFICULTIES or variant not in VARIANTS:
+            return jsonify({'success': False, 'error': '無効なランキングです'})
+        if daily == 'today':
+            daily = today()
+        if daily and not DAILY_DATE.match(daily):
+            return jsonify({'success': False, 'error': '日付はYYYY-MM-DDで指定してください'})
+        
+        key = board_key(difficulty, variant, daily)
+        entries, total = leaderboards.top(key, limit, offset)
+        entry_id = session.get('entries', {}).get(key)
         
         return jsonify({
             'success': True,
-            'hint': hint
+            'board': key,
+            'total': total,
+            'entries': entries,
+            'me': leaderboards.entry(key, entry_id) if entry_id is not None else None
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def join_race(room):
+    # Each player gets their own game on the room's puzzle
+    encoding = board_encoding()
+    puzzle = room.puzzle.fresh_copy()
+    player_id = room.join(session.get('name') or clean_name(None))
+    # A list so it round-trips unchanged through the saved game state
+    puzzle.race = [room.room_id, player_id]
+    
+    game_id = str(uuid.uuid4())
+    games[game_id] = puzzle
+    session['game_id'] = game_id
+    log_event('race_join', game_id=game_id, room=room.room_id, player=player_id)
+    
+    return jsonify({
+        'success': True,
+        'game_id': game_id,
+        'room': room.room_id,
+        'player_id': player_id,
+        'puzzle': encode_board(puzzle.puzzle_board, encoding),
+        'user_board': encode_board(puzzle.user_board, encoding),
+        'encoding': encoding,
+        'difficulty': puzzle.difficulty,
+        'variant': puzzle.variant.to_dict(),
+        'validation': 'server'
+    })
+
+@game_bp.route('/race/create', methods=['POST'])
+def create_race():
+    try:
+        data = request.get_json() or {}
+        difficulty = data.get('difficulty', 'medium')
+        variant = data.get('variant', 'classic')
+        if variant not in VARIANTS:
+            return jsonify({'success': False, 'error': '無効なルールです'})
+        if data.get('name'):
+            session['name'] = clean_name(data['name'])
+        
+        def generate():
+            puzzle = SudokuPuzzle()
+            puzzle.create_puzzle(difficulty, variant)
+            return puzzle
+        
+        room = races.create(run_generation(difficulty, generate))
+        return join_race(room)
+    except GenerationBusy as busy:
+        return busy_response(busy)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@game_bp.route('/race/<room_id>/join', methods=['POST'])
+def race_join(room_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get('name'):
+            session['name'] = clean_name(data['name'])
+        
+        room = races.get(room_id)
+        if room is None or room.closed:
+            return jsonify({'success': False, 'error': '対戦部屋が見つかりません'})
+        return join_race(room)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@game_bp.route('/race/<room_id>/events', methods=['GET'])
+def race_events(room_id):
+    room = races.get(room_id)
+    if room is None:
+        return jsonify({'success': False, 'error': '対戦部屋が見つかりません'}), 404
+    # Reconnecting EventSource clients resume from Last-Event-ID
+    try:
+        last_version = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_version = 0
+    return Response(races.events(room, last_version), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@game_bp.route('/profiles', methods=['GET'])
+def profiles():
+    denied = profiler_access()
+    if denied:
+        return denied
+    return jsonify({'success': True, 'profiles': profiler.list()})
+
+@game_bp.route('/profiles/<int:profile_id>.prof', methods=['GET'])
+def download_profile(profile_id):
+    denied = profiler_access()
+    if denied:
+        return denied
+    data = profiler.get(profile_id)
+    if data is None:
+        return jsonify({'success': False, 'error': 'プロファイルが見つかりません'}), 404
+    # cProfile/pstats format for snakeviz, flameprof, gprof2dot and friends
+    return Response(data, mimetype='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename=profile-{profile_id}.prof'})
+
 # Register Blueprint
 app.register_blueprint(game_bp)
 
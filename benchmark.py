@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""ナンプレWebアプリのベンチマーク
+
+    python3 benchmark.py wire         # 盤面の通信表現ごとのレスポンスサイズとエンコード時間
+    python3 benchmark.py leaderboard  # ランキングの追加・順位・上位の取得（--size件）
+    python3 benchmark.py coldstart    # 新しいプロセスでの読み込み時間と最初のリクエストの時間
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+
+def bench_wire(args):
+    """盤面の表現（json / string / packed）ごとにレスポンスのバイト数とエンコード時間を測る"""
+    from app import app
+    from sudoku import BOARD_ENCODINGS, SudokuPuzzle, encode_board
+
+    puzzle = SudokuPuzzle()
+    puzzle.create_puzzle("medium")
+    client = app.test_client()
+    results = {}
+
+    for encoding in BOARD_ENCODINGS:
+        payload = {
+            'success': True,
+            'game_id': '00000000-0000-0000-0000-000000000000',
+            'puzzle': encode_board(puzzle.puzzle_board, encoding),
+            'user_board': encode_board(puzzle.user_board, encoding),
+            'solution': encode_board(puzzle.complete_board, encoding),
+            'encoding': encoding,
+            'difficulty': 'medium'
+        }
+
+        # 盤面の変換とJSON化（アプリのJSONプロバイダー）にかかる時間
+        with app.app_context():
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                app.json.dumps({
+                    **payload,
+                    'puzzle': encode_board(puzzle.puzzle_board, encoding),
+                    'user_board': encode_board(puzzle.user_board, encoding),
+                    'solution': encode_board(puzzle.complete_board, encoding)
+                })
+            encode_us = (time.perf_counter() - start) / args.iterations * 1e6
+
+        # 実際のルートのレスポンスサイズ
+        new_game = client.post(f'/game/new_game?encoding={encoding}',
+                               json={'difficulty': 'easy', 'validation': 'solution'})
+        row, col = next((i, j) for i in range(9) for j in range(9)
+                        if new_game.get_json()['puzzle'] and
+                        puzzle_value(new_game.get_json()['puzzle'], i, j, encoding) == 0)
+        make_move = client.post(f'/game/make_move?encoding={encoding}', json={'row': row, 'col': col, 'num': 1})
+
+        results[encoding] = {
+            'encode_us': encode_us,
+            'board_bytes': len(json.dumps(encode_board(puzzle.puzzle_board, encoding), separators=(',', ':'))),
+            'new_game_bytes': len(new_game.data),
+            'make_move_bytes': len(make_move.data),
+        }
+
+    print(f"{'encoding':<10}{'board':>8}{'new_game':>10}{'make_move':>11}{'encode':>12}", file=sys.stderr)
+    for encoding, r in results.items():
+        print(f"{encoding:<10}{r['board_bytes']:>7}B{r['new_game_bytes']:>9}B{r['make_move_bytes']:>10}B"
+              f"{r['encode_us']:>10.1f}µs", file=sys.stderr)
+    return results
+
+
+def puzzle_value(encoded, row, col, encoding):
+    """エンコードされた盤面から1マスの値を取り出す"""
+    from sudoku import parse_board
+    board = encoded if encoding == 'json' else parse_board(encoded)
+    return board[row][col]
+
+
+def bench_leaderboard(args):
+    """--size件のランキングで追加・自分の順位・上位10件・保存と読み込みの時間を測る"""
+    from leaderboard import Leaderboard
+
+    rng = random.Random(1)
+    board = Leaderboard()
+    start = time.perf_counter()
+    for n in range(args.size):
+        board.add(rng.randint(60000, 3600000), f"player{n}")
+    build_s = time.perf_counter() - start
+
+    def per_op_us(func, count):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        return (time.perf_counter() - start) / count * 1e6
+
+    count = min(args.iterations, 100000)
+    results = {
+        'size': args.size,
+        'build_s': build_s,
+        'add_us': per_op_us(lambda: board.add(rng.randint(60000, 3600000), "player"), count),
+        'rank_us': per_op_us(lambda: board.rank(rng.randrange(len(board))), count),
+        'top10_us': per_op_us(lambda: board.top(10), count),
+        'page_us': per_op_us(lambda: board.top(10, rng.randrange(len(board) - 10)), count),
+    }
+
+    start = time.perf_counter()
+    data = board.to_bytes()
+    results['save_s'] = time.perf_counter() - start
+    results['saved_bytes'] = len(data)
+    start = time.perf_counter()
+    Leaderboard.from_bytes(data)
+    results['load_s'] = time.perf_counter() - start
+
+    print(f"{results['size']:,}件（作成 {build_s:.1f}秒）", file=sys.stderr)
+    for name in ('add_us', 'rank_us', 'top10_us', 'page_us'):
+        print(f"  {name[:-3]:<8}{results[name]:>8.2f}µs", file=sys.stderr)
+    print(f"  保存 {results['save_s']:.2f}秒 / {results['saved_bytes'] / 1e6:.1f}MB、"
+          f"読み込み {results['load_s']:.2f}秒", file=sys.stderr)
+    return results
+
+
+# 新しいプロセスで実行する計測用のスクリプト
+COLDSTART_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import sudoku
+engine = time.perf_counter()
+import {module} as entry
+imported = time.perf_counter()
+client = entry.app.test_client()
+client.post('/game/new_game', json={{'difficulty': 'easy'}})
+first = time.perf_counter()
+client.post('/game/new_game', json={{'difficulty': 'easy'}})
+warm = time.perf_counter()
+print(json.dumps({{
+    'engine_import_ms': (engine - start) * 1000,
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (first - imported) * 1000,
+    'warm_request_ms': (warm - first) * 1000,
+}}))
+"""
+
+
+def bench_coldstart(args):
+    """サーバーレスのコールドスタートを真似て、新しいプロセスごとに読み込みと最初のリクエストを測る"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module in ('api.index', 'app'):
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, '-c', COLDSTART_SCRIPT.format(module=module)],
+                                    cwd=root, capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        results[module] = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+
+    print(f"{'module':<12}{'engine':>10}{'import':>10}{'first':>10}{'warm':>10}  (中央値, {args.runs}回)",
+          file=sys.stderr)
+    for module, r in results.items():
+        print(f"{module:<12}{r['engine_import_ms']:>8.1f}ms{r['import_ms']:>8.1f}ms"
+              f"{r['first_request_ms']:>8.1f}ms{r['warm_request_ms']:>8.1f}ms", file=sys.stderr)
+    return results
+
+
+BENCHMARKS = {
+    'wire': bench_wire,
+    'leaderboard': bench_leaderboard,
+    'coldstart': bench_coldstart,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ナンプレWebアプリのベンチマーク')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help='実行するベンチマーク')
+    parser.add_argument('--iterations', type=int, default=10000, help='繰り返し回数')
+    parser.add_argument('--size', type=int, default=1000000, help='ランキングの件数（leaderboard）')
+    parser.add_argument('--runs', type=int, default=10, help='プロセスを起動する回数（coldstart）')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで標準出力に出す')
+    args = parser.parse_args(argv)
+
+    results = BENCHMARKS[args.benchmark](args)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
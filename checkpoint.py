@@ -0,0 +1,84 @@
+import json
+import sqlite3
+import threading
+
+from sudoku import CLASSIC, Variant, pack_board, unpack_board
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    game_id TEXT PRIMARY KEY,
+    boards TEXT NOT NULL
+) WITHOUT ROWID
+"""
+
+SAVE_SNAPSHOT = "INSERT OR REPLACE INTO snapshots (game_id, boards) VALUES (?, ?)"
+LOAD_SNAPSHOT = "SELECT boards FROM snapshots WHERE game_id = ?"
+DELETE_SNAPSHOT = "DELETE FROM snapshots WHERE game_id = ?"
+COUNT_SNAPSHOTS = "SELECT COUNT(*) FROM snapshots"
+
+# 1盤面あたりのpack_boardの長さ
+PACKED_LENGTH = 56
+
+
+class GameCheckpoint:
+    """メモリ上のゲームを再起動後も続けられるように書き出すスナップショットファイル
+
+    解答・問題・入力中の盤面をpack_boardで詰めて（168文字）ゲームIDをキーに保存します。
+    その後ろに難易度・開始時刻などの状態と変則ルールをJSONで付けます。
+    起動時に全件を読み込むことはせず、load()でゲームIDごとに取り出すので、
+    保存したゲームが増えても起動時間は変わりません。
+    """
+
+    def __init__(self, path, puzzle_factory):
+        self.path = path
+        self.puzzle_factory = puzzle_factory
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+
+    @staticmethod
+    def dump(puzzle):
+        """パズルを保存用の文字列にする"""
+        boards = (pack_board(puzzle.complete_board) + pack_board(puzzle.puzzle_board)
+                  + pack_board(puzzle.user_board))
+        state = puzzle.state_dict()
+        if puzzle.variant is not CLASSIC:
+            state['variant'] = puzzle.variant.to_dict()
+        return boards + json.dumps(state, separators=(',', ':'), ensure_ascii=False)
+
+    def load(self, game_id):
+        """保存されたゲームを復元する（無ければNone）"""
+        with self._lock:
+            row = self._conn.execute(LOAD_SNAPSHOT, (game_id,)).fetchone()
+        if row is None:
+            return None
+
+        boards = row[0]
+        puzzle = self.puzzle_factory()
+        puzzle.complete_board = unpack_board(boards[:PACKED_LENGTH])
+        puzzle.puzzle_board = unpack_board(boards[PACKED_LENGTH:PACKED_LENGTH * 2])
+        puzzle.user_board = unpack_board(boards[PACKED_LENGTH * 2:PACKED_LENGTH * 3])
+        state = json.loads(boards[PACKED_LENGTH * 3:])
+        puzzle.restore_state(state)
+        if 'variant' in state:
+            puzzle.variant = Variant.from_dict(state['variant'])
+        return puzzle
+
+    def write(self, snapshots, deleted=()):
+        """変更のあったゲームと削除されたゲームを1トランザクションで反映する"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(SAVE_SNAPSHOT, snapshots)
+                self._conn.executemany(DELETE_SNAPSHOT, [(game_id,) for game_id in deleted])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(COUNT_SNAPSHOTS).fetchone()[0]
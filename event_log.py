@@ -0,0 +1,196 @@
+import atexit
+import glob
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+
+
+class EventLog:
+    """ゲームの出来事（new_game・move・hint・checkなど）を追記専用のJSONLに書き出す
+
+    log()はキューに積むだけで、JSON化と書き込みはバックグラウンドのスレッドが
+    行います。バッファがflush_bytesを超えるか、flush_interval秒たつと書き込み、
+    ファイルがmax_file_bytesを超えたら新しいファイルに切り替えます。
+    キューがいっぱいのときは待たずに捨てて件数だけ数えます。
+    終了時にはキューに残っている出来事を書き込んでから閉じます。
+    """
+
+    def __init__(self, directory, flush_bytes=64 * 1024, flush_interval=1.0,
+                 max_file_bytes=64 * 1024 * 1024, queue_size=100000):
+        self.directory = directory
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._file_bytes = 0
+        self._sequence = 0
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def log(self, event, **fields):
+        """出来事を記録（リクエスト処理を待たせない）"""
+        fields['ts'] = time.time()
+        fields['event'] = event
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """キューに積まれた出来事を書き込むまで待つ"""
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """残っている出来事を書き込んでファイルを閉じる（2回目以降は何もしない）"""
+        if not self._writer.is_alive():
+            return
+        self._queue.put(None, timeout=timeout)
+        self._writer.join(timeout)
+
+    def _open_next_file(self):
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        name = f"events-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence:04d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), 'a', encoding='utf-8')
+        self._file_bytes = 0
+
+    def _write(self, lines):
+        data = ''.join(lines)
+        if self._file is None or self._file_bytes + len(data) > self.max_file_bytes:
+            self._open_next_file()
+        self._file.write(data)
+        self._file.flush()
+        self._file_bytes += len(data)
+
+    def _write_loop(self):
+        lines = []
+        size = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+
+            if isinstance(item, dict):
+                line = json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n'
+                lines.append(line)
+                size += len(line)
+                if size < self.flush_bytes and time.monotonic() < deadline:
+                    continue
+
+            if lines:
+                self._write(lines)
+                lines = []
+                size = 0
+            deadline = time.monotonic() + self.flush_interval
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+
+def _read_file(name):
+    with open(name, encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # 書き込み途中で止まった行は飛ばす
+                continue
+
+
+def read_events(paths):
+    """ログファイル（またはディレクトリ）から出来事を時刻順に1件ずつ読む
+
+    ファイルはワーカー（プロセス）ごとに分かれていて、1つのゲームの出来事が
+    複数のファイルにまたがることがあるので、ファイルごとの流れをtsで併合します。
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, 'events-*.jsonl'))))
+        else:
+            files.append(path)
+
+    yield from heapq.merge(*(_read_file(name) for name in files), key=lambda event: event.get('ts', 0))
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def build_report(events):
+    """難易度ごとの解答時間の分布などを集計"""
+    open_games = {}
+    stats = {}
+
+    def difficulty_stats(difficulty):
+        return stats.setdefault(difficulty, {
+            'started': 0, 'solved': 0, 'times': [], 'moves': [], 'hints': [], 'wrong_checks': 0
+        })
+
+    for event in events:
+        kind = event.get('event')
+        game_id = event.get('game_id')
+        if kind == 'new_game':
+            difficulty = event.get('difficulty', 'unknown')
+            difficulty_stats(difficulty)['started'] += 1
+            open_games[game_id] = {'difficulty': difficulty, 'start': event['ts'], 'moves': 0, 'hints': 0}
+            continue
+
+        game = open_games.get(game_id)
+        if game is None:
+            continue
+        if kind == 'move':
+            game['moves'] += 1
+        elif kind == 'sync':
+            # クライアント側で検証するゲームの手は同期で変わったマスの数で数える
+            game['moves'] += event.get('changed', 0)
+        elif kind == 'hint':
+            game['hints'] += 1
+        elif kind == 'check':
+            entry = difficulty_stats(game['difficulty'])
+            if event.get('correct'):
+                entry['solved'] += 1
+                entry['times'].append(event['ts'] - game['start'])
+                entry['moves'].append(game['moves'])
+                entry['hints'].append(game['hints'])
+                del open_games[game_id]
+            else:
+                entry['wrong_checks'] += 1
+
+    report = {}
+    for difficulty, entry in sorted(stats.items()):
+        times = sorted(entry['times'])
+        solved = entry['solved']
+        report[difficulty] = {
+            'started': entry['started'],
+            'solved': solved,
+            'solve_rate': solved / entry['started'] if entry['started'] else None,
+            'wrong_checks': entry['wrong_checks'],
+            'time_p25_s': _percentile(times, 25),
+            'time_p50_s': _percentile(times, 50),
+            'time_p75_s': _percentile(times, 75),
+            'time_p90_s': _percentile(times, 90),
+            'mean_moves': sum(entry['moves']) / solved if solved else None,
+            'mean_hints': sum(entry['hints']) / solved if solved else None,
+        }
+    return report
@@ -0,0 +1,143 @@
+import atexit
+import threading
+from contextlib import contextmanager
+
+
+class ShardedGameStore:
+    """スレッドセーフなゲーム保存領域
+
+    ゲームIDのハッシュでシャードに振り分け、辞書の読み書きはシャードごとの
+    ロック（ロックストライピング）で守ります。1ゲームへの操作はゲームごとの
+    ロックで直列化するため、別々のゲームへの操作が互いを待つことはありません。
+
+    checkpoint（GameCheckpoint）を渡すと、前回から変更のあったゲームだけを
+    checkpoint_interval秒ごと（と終了時）にスナップショットへ書き出し、
+    再起動後はメモリに無いゲームを最初にアクセスされたときに読み込みます。
+    """
+
+    def __init__(self, shard_count=64, checkpoint=None, checkpoint_interval=5.0):
+        self.shard_count = shard_count
+        self.shards = [{} for _ in range(shard_count)]
+        self.shard_locks = [threading.Lock() for _ in range(shard_count)]
+
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self._dirty = set()
+        self._deleted = set()
+        self._dirty_lock = threading.Lock()
+        self._checkpointer = None
+        if checkpoint is not None:
+            atexit.register(self.checkpoint_now)
+
+    def _shard_index(self, game_id):
+        return hash(game_id) % self.shard_count
+
+    def _cached(self, game_id):
+        index = self._shard_index(game_id)
+        with self.shard_locks[index]:
+            return self.shards[index].get(game_id)
+
+    def _entry(self, game_id):
+        entry = self._cached(game_id)
+        if entry is not None or self.checkpoint is None:
+            return entry
+
+        # 再起動前のゲームはスナップショットから読み込む
+        with self._dirty_lock:
+            if game_id in self._deleted:
+                return None
+        puzzle = self.checkpoint.load(game_id)
+        if puzzle is None:
+            return None
+        index = self._shard_index(game_id)
+        with self.shard_locks[index]:
+            return self.shards[index].setdefault(game_id, (puzzle, threading.RLock()))
+
+    def _mark_dirty(self, game_id):
+        with self._dirty_lock:
+            self._dirty.add(game_id)
+            self._deleted.discard(game_id)
+        if self._checkpointer is None or not self._checkpointer.is_alive():
+            self._checkpointer = threading.Thread(target=self._checkpoint_loop, daemon=True)
+            self._checkpointer.start()
+
+    def _checkpoint_loop(self):
+        stop = threading.Event()
+        while not stop.wait(self.checkpoint_interval):
+            self.checkpoint_now()
+
+    def checkpoint_now(self):
+        """前回から変更のあったゲームをスナップショットに書き出し、書き出した件数を返す"""
+        if self.checkpoint is None:
+            return 0
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+            deleted, self._deleted = self._deleted, set()
+        if not dirty and not deleted:
+            return 0
+
+        snapshots = []
+        for game_id in dirty:
+            entry = self._cached(game_id)
+            if entry is None:
+                continue
+            puzzle, lock = entry
+            with lock:
+                snapshots.append((game_id, self.checkpoint.dump(puzzle)))
+
+        try:
+            self.checkpoint.write(snapshots, deleted)
+        except Exception:
+            # 書き込めなかった分は次回にまわす
+            with self._dirty_lock:
+                self._dirty.update(dirty)
+                self._deleted.update(deleted - self._dirty)
+            raise
+        return len(snapshots)
+
+    def __setitem__(self, game_id, puzzle):
+        index = self._shard_index(game_id)
+        with self.shard_locks[index]:
+            self.shards[index][game_id] = (puzzle, threading.RLock())
+        if self.checkpoint is not None:
+            self._mark_dirty(game_id)
+
+    def __getitem__(self, game_id):
+        entry = self._entry(game_id)
+        if entry is None:
+            raise KeyError(game_id)
+        return entry[0]
+
+    def __delitem__(self, game_id):
+        index = self._shard_index(game_id)
+        with self.shard_locks[index]:
+            del self.shards[index][game_id]
+        if self.checkpoint is not None:
+            with self._dirty_lock:
+                self._dirty.discard(game_id)
+                self._deleted.add(game_id)
+
+    def __contains__(self, game_id):
+        return self._entry(game_id) is not None
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def get(self, game_id, default=None):
+        entry = self._entry(game_id)
+        return default if entry is None else entry[0]
+
+    @contextmanager
+    def locked(self, game_id):
+        """ゲームのロックを取った状態でパズルを渡す（見つからなければNone）"""
+        entry = self._entry(game_id) if game_id else None
+        if entry is None:
+            yield None
+            return
+
+        puzzle, lock = entry
+        with lock:
+            version = puzzle.version if self.checkpoint is not None else None
+            yield puzzle
+            if self.checkpoint is not None and puzzle.version != version:
+                self._mark_dirty(game_id)
@@ -0,0 +1,385 @@
+import atexit
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+
+class RankedList:
+    """順位（何番目か）をO(log n)で求められるソート済みリスト
+
+    値は最大2*LOAD個ずつのソート済みバケットに分けて持ち、バケットの長さを
+    フェニック木（BIT）で数えます。挿入・削除・順位・k番目の取り出しは
+    バケットの二分探索とフェニック木の更新だけで済みます。
+    """
+
+    LOAD = 1000
+
+    def __init__(self, values=()):
+        values = sorted(values)
+        self._buckets = [values[i:i + self.LOAD] for i in range(0, len(values), self.LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(values)
+        self._build_index()
+
+    def _build_index(self):
+        tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, index, delta):
+        tree = self._tree
+        i = index + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, index):
+        """index番目より前のバケットに入っている値の数"""
+        tree = self._tree
+        total = 0
+        i = index
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position):
+        """position番目の値が入っている(バケット, バケット内の位置)"""
+        tree = self._tree
+        index = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(tree) and tree[nxt] <= position:
+                index = nxt
+                position -= tree[nxt]
+            step >>= 1
+        return index, position
+
+    def add(self, value):
+        if not self._buckets:
+            self._buckets.append([value])
+            self._maxes.append(value)
+            self._len = 1
+            self._build_index()
+            return
+
+        index = bisect_right(self._maxes, value)
+        if index == len(self._buckets):
+            index -= 1
+        bucket = self._buckets[index]
+        insort(bucket, value)
+        self._maxes[index] = bucket[-1]
+        self._len += 1
+
+        if len(bucket) > self.LOAD * 2:
+            # 大きくなったバケットは2つに分ける（たまにしか起きないので索引は作り直す）
+            self._buckets[index:index + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self._maxes[index:index + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+            self._build_index()
+        else:
+            self._update(index, 1)
+
+    def remove(self, value):
+        index = bisect_left(self._maxes, value)
+        if index == len(self._buckets):
+            raise ValueError(value)
+        bucket = self._buckets[index]
+        position = bisect_left(bucket, value)
+        if position == len(bucket) or bucket[position] != value:
+            raise ValueError(value)
+
+        del bucket[position]
+        self._len -= 1
+        if bucket:
+            self._maxes[index] = bucket[-1]
+            self._update(index, -1)
+        else:
+            del self._buckets[index]
+            del self._maxes[index]
+            self._build_index()
+
+    def rank(self, value):
+        """valueより小さい値の数"""
+        index = bisect_left(self._maxes, value)
+        if index == len(self._buckets):
+            return self._len
+        return self._prefix(index) + bisect_left(self._buckets[index], value)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self._len
+        if not 0 <= position < self._len:
+            raise IndexError(position)
+        index, offset = self._locate(position)
+        return self._buckets[index][offset]
+
+    def islice(self, start, stop):
+        """start番目からstop番目の手前までの値"""
+        stop = min(stop, self._len)
+        if start >= stop:
+            return
+        index, offset = self._locate(start)
+        count = stop - start
+        while count > 0:
+            bucket = self._buckets[index]
+            chunk = bucket[offset:offset + count]
+            yield from chunk
+            count -= len(chunk)
+            index += 1
+            offset = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+
+def clean_name(name):
+    """表示名から改行などの制御文字を取り除き、20文字までにする"""
+    name = ''.join(ch for ch in str(name or '') if ch.isprintable()).strip()
+    return name[:20] or "名無し"
+
+
+class Leaderboard:
+    """1つのランキング（難易度ごと・日替わり問題ごと）
+
+    記録には追加順の番号（entry_id）を振り、解答時間（ミリ秒）と番号を1つの整数
+    （時間 << 32 | 番号）にしてRankedListに入れます。同じ時間なら先に解いた方が上です。
+    時間はarray、名前はリストに番号順で持ちます（1件あたり150バイト程度）。
+    """
+
+    def __init__(self):
+        self._ranks = RankedList()
+        self._times = array('I')
+        self._names = []
+
+    def _key(self, entry_id):
+        return self._times[entry_id] << 32 | entry_id
+
+    def add(self, time_ms, name):
+        """記録を追加して番号を返す"""
+        entry_id = len(self._times)
+        self._times.append(min(int(time_ms), 0xFFFFFFFF))
+        self._names.append(clean_name(name))
+        self._ranks.add(self._key(entry_id))
+        return entry_id
+
+    def rank(self, entry_id):
+        """記録の順位（1位から）"""
+        if not 0 <= entry_id < len(self._times):
+            return None
+        return self._ranks.rank(self._key(entry_id)) + 1
+
+    def entry(self, entry_id, rank=None):
+        return {
+            'rank': rank or self.rank(entry_id),
+            'name': self._names[entry_id],
+            'time_ms': self._times[entry_id]
+        }
+
+    def top(self, limit=10, start=0):
+        """start+1位からlimit件"""
+        return [self.entry(key & 0xFFFFFFFF, start + n + 1)
+                for n, key in enumerate(self._ranks.islice(start, start + limit))]
+
+    def __len__(self):
+        return len(self._times)
+
+    def copy(self):
+        """保存用に時間と名前だけを写したもの（並び順の索引は作らない）"""
+        board = Leaderboard.__new__(Leaderboard)
+        board._times = array('I', self._times)
+        board._names = self._names[:]
+        return board
+
+    def to_bytes(self):
+        """件数・時間の配列（リトルエンディアン）・改行区切りの名前をzlibで圧縮"""
+        times = array('I', self._times)
+        if sys.byteorder == 'big':
+            times.byteswap()
+        data = struct.pack('<I', len(times)) + times.tobytes() + '\n'.join(self._names).encode()
+        return zlib.compress(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = zlib.decompress(data)
+        count = struct.unpack_from('<I', data)[0]
+        board = cls()
+        board._times.frombytes(data[4:4 + count * 4])
+        if sys.byteorder == 'big':
+            board._times.byteswap()
+        names = data[4 + count * 4:].decode()
+        board._names = names.split('\n') if count else []
+        board._ranks = RankedList(board._key(entry_id) for entry_id in range(count))
+        return board
+
+
+BOARD_KEY = re.compile(r'^[a-z0-9][a-z0-9-]{0,63}$')
+
+
+def board_key(difficulty, variant="classic", daily=None):
+    """ランキングの名前（例: medium / killer-hard / daily-2026-01-01-easy）"""
+    key = difficulty if variant == "classic" else f"{variant}-{difficulty}"
+    if daily:
+        key = f"daily-{daily}-{key}"
+    if not BOARD_KEY.match(key):
+        raise ValueError("ランキングの指定が正しくありません")
+    return key
+
+
+class LeaderboardStore:
+    """ランキングをまとめて持ち、directoryがあればファイルに保存する
+
+    ランキングは最初に使われたときにファイルから読み込み、記録が増えたものだけを
+    save_interval秒ごと（と終了時）に書き出します。読むだけのときは記録の無い
+    ランキングをメモリに作りません。
+    ファイルは丸ごと置き換えるので、同じdirectoryを使えるのは1プロセスだけです
+    （複数のワーカーで共有するときはSQLiteLeaderboardStoreを使います）。
+    """
+
+    def __init__(self, directory=None, save_interval=30.0):
+        self.directory = directory
+        self.save_interval = save_interval
+        self._boards = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._saver = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.save)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.lb")
+
+    def _board(self, key, create=True):
+        """ランキングを返す（create=Falseなら記録が無いときNone）"""
+        board = self._boards.get(key)
+        if board is None:
+            if self.directory and os.path.exists(self._path(key)):
+                with open(self._path(key), 'rb') as f:
+                    board = Leaderboard.from_bytes(f.read())
+            elif create:
+                board = Leaderboard()
+            else:
+                return None
+            self._boards[key] = board
+        return board
+
+    def record(self, key, time_ms, name):
+        """記録を追加して(番号, 順位, 件数)を返す"""
+        with self._lock:
+            board = self._board(key)
+            entry_id = board.add(time_ms, name)
+            self._dirty.add(key)
+            result = entry_id, board.rank(entry_id), len(board)
+        if self.directory and (self._saver is None or not self._saver.is_alive()):
+            self._saver = threading.Thread(target=self._save_loop, daemon=True)
+            self._saver.start()
+        return result
+
+    def top(self, key, limit=10, start=0):
+        with self._lock:
+            board = self._board(key, create=False)
+            if board is None:
+                return [], 0
+            return board.top(limit, start), len(board)
+
+    def entry(self, key, entry_id):
+        with self._lock:
+            board = self._board(key, create=False)
+            if board is None or board.rank(entry_id) is None:
+                return None
+            return board.entry(entry_id)
+
+    def _save_loop(self):
+        stop = threading.Event()
+        while not stop.wait(self.save_interval):
+            self.save()
+
+    def save(self):
+        """記録の増えたランキングを書き出し、書き出した数を返す"""
+        if not self.directory:
+            return 0
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshots = [(key, self._boards[key].copy()) for key in dirty]
+
+        for key, board in snapshots:
+            data = board.to_bytes()
+            # 書きかけのファイルを読まないように別名で書いてから置き換える
+            tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        return len(snapshots)
+
+
+LEADERBOARD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leaderboard (
+    board TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    time_ms INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (board, entry_id)
+) WITHOUT ROWID
+"""
+
+NEXT_ENTRY_ID = "SELECT COALESCE(MAX(entry_id) + 1, 0) FROM leaderboard WHERE board = ?"
+INSERT_ENTRY = "INSERT INTO leaderboard (board, entry_id, time_ms, name) VALUES (?, ?, ?, ?)"
+SELECT_ENTRIES = "SELECT time_ms, name FROM leaderboard WHERE board = ? AND entry_id >= ? ORDER BY entry_id"
+
+
+class SQLiteLeaderboardStore(LeaderboardStore):
+    """記録をSQLite（WALモード）に保存し、ワーカープロセス間で共有するランキング
+
+    記録には書き込みをロックしたトランザクションの中でランキングごとの連番を振るので、
+    番号（entry_id）はどのワーカーから見ても同じで、メモリ上のLeaderboardの番号とも一致します。
+    順位はこれまでどおりメモリ上のRankedListで求め、ランキングを使うたびに
+    他のワーカーが追加した分（自分の持っている件数より後の番号）だけを読み足します。
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(LEADERBOARD_SCHEMA)
+
+    def _board(self, key, create=True):
+        board = self._boards.get(key)
+        rows = self._conn.execute(SELECT_ENTRIES, (key, len(board) if board else 0)).fetchall()
+        if board is None:
+            if not rows and not create:
+                return None
+            board = self._boards[key] = Leaderboard()
+        for time_ms, name in rows:
+            board.add(time_ms, name)
+        return board
+
+    def record(self, key, time_ms, name):
+        """記録を追加して(番号, 順位, 件数)を返す"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                entry_id = self._conn.execute(NEXT_ENTRY_ID, (key,)).fetchone()[0]
+                self._conn.execute(INSERT_ENTRY, (key, entry_id, min(int(time_ms), 0xFFFFFFFF), clean_name(name)))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            board = self._board(key)
+            return entry_id, board.rank(entry_id), len(board)
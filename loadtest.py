@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""ナンプレWebアプリの負荷試験ツール
+
+プレイヤーのセッション（新しいゲーム → 数字入力 → ヒント → 解答チェック）を
+並列に実行し、ルートごとのレイテンシ・エラー率・スループット・メモリ増加を計測します。
+
+    python3 loadtest.py --sessions 1000 --concurrency 50
+    python3 loadtest.py --url http://127.0.0.1:8080 --server-pid 1234 --report report.json
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import resource
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TestClientTransport:
+    """Flaskのテストクライアント経由でリクエストを送る（プロセス内）"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def post(self, path, payload=None):
+        response = self.client.post(path, json=payload or {})
+        return response.status_code, response.get_json()
+
+
+class HttpTransport:
+    """稼働中のサーバーにHTTPでリクエストを送る"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def post(self, path, payload=None):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload or {}).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST')
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+class Stats:
+    """ルートごとのレイテンシとエラーを集計"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self):
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            errors = self.errors.get(route, 0)
+            routes[route] = {
+                'count': len(values),
+                'errors': errors,
+                'error_rate': errors / len(values),
+                'mean_ms': sum(values) / len(values) * 1000,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p90_ms': percentile(values, 90) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': values[-1] * 1000,
+            }
+        return routes
+
+
+def percentile(sorted_values, pct):
+    """最近傍順位法でパーセンタイルを求める"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def rss_bytes(pid=None):
+    """プロセスの常駐メモリ（RSS）をバイトで返す"""
+    path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if pid is None:
+        # /procが無い環境ではピーク値で代用
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def call(transport, stats, route, payload=None):
+    """1リクエストを送信して計測"""
+    start = time.perf_counter()
+    try:
+        status, data = transport.post(route, payload)
+        ok = status == 200 and bool(data) and data.get('success', False)
+    except Exception:
+        data, ok = None, False
+    stats.record(route, time.perf_counter() - start, ok)
+    return data if ok else None
+
+
+def run_session(transport, stats, moves, hints, rng):
+    """1人分のプレイヤーセッションを再現"""
+    difficulty = rng.choice(['easy', 'medium', 'hard'])
+    game = call(transport, stats, '/game/new_game', {'difficulty': difficulty, 'validation': 'solution'})
+    if game is None:
+        return
+
+    puzzle = game['puzzle']
+    solution = game['solution']
+    empty_cells = [(i, j) for i in range(9) for j in range(9) if puzzle[i][j] == 0]
+    rng.shuffle(empty_cells)
+
+    for n, (row, col) in enumerate(empty_cells[:moves]):
+        # 1割程度は間違えてから消す
+        if rng.random() < 0.1:
+            call(transport, stats, '/game/make_move', {'row': row, 'col': col, 'num': rng.randint(1, 9)})
+            call(transport, stats, '/game/clear_cell', {'row': row, 'col': col})
+        call(transport, stats, '/game/make_move', {'row': row, 'col': col, 'num': solution[row][col]})
+        if n < hints:
+            call(transport, stats, '/game/get_hint')
+
+    call(transport, stats, '/game/check_solution')
+
+
+def run_load_test(make_transport, sessions, concurrency, moves, hints, seed=None, server_pid=None):
+    """セッションを並列に実行してレポートを返す"""
+    stats = Stats()
+    seeds = random.Random(seed)
+    session_seeds = [seeds.random() for _ in range(sessions)]
+    rss_before = rss_bytes(server_pid)
+
+    def worker(session_seed):
+        run_session(make_transport(), stats, moves, hints, random.Random(session_seed))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, session_seeds))
+    duration = time.perf_counter() - start
+
+    rss_after = rss_bytes(server_pid)
+    routes = stats.summary()
+    total_requests = sum(r['count'] for r in routes.values())
+    total_errors = sum(r['errors'] for r in routes.values())
+
+    return {
+        'config': {
+            'sessions': sessions,
+            'concurrency': concurrency,
+            'moves': moves,
+            'hints': hints,
+            'seed': seed,
+        },
+        'duration_s': duration,
+        'requests': total_requests,
+        'errors': total_errors,
+        'error_rate': total_errors / total_requests if total_requests else 0.0,
+        'throughput_rps': total_requests / duration if duration else 0.0,
+        'sessions_per_s': sessions / duration if duration else 0.0,
+        'routes': routes,
+        'memory': {
+            'rss_before': rss_before,
+            'rss_after': rss_after,
+            'rss_growth': (rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+        },
+    }
+
+
+def print_report(report, out=sys.stdout):
+    """レポートを表形式で表示"""
+    print("=" * 72, file=out)
+    print(f"セッション: {report['config']['sessions']}  並列数: {report['config']['concurrency']}  "
+          f"所要時間: {report['duration_s']:.2f}秒", file=out)
+    print(f"リクエスト: {report['requests']}  スループット: {report['throughput_rps']:.1f} req/s  "
+          f"エラー率: {report['error_rate']:.2%}", file=out)
+    print("-" * 72, file=out)
+    print(f"{'route':<22}{'count':>8}{'err':>6}{'p50ms':>9}{'p90ms':>9}{'p99ms':>9}{'maxms':>9}", file=out)
+    for route, r in report['routes'].items():
+        print(f"{route:<22}{r['count']:>8}{r['errors']:>6}{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}"
+              f"{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}", file=out)
+    growth = report['memory']['rss_growth']
+    if growth is not None:
+        print("-" * 72, file=out)
+        print(f"メモリ増加: {growth / 1024 / 1024:.1f} MiB", file=out)
+    print("=" * 72, file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ナンプレWebアプリの負荷試験')
+    parser.add_argument('--url', help='稼働中のサーバーのURL（省略時はプロセス内のテストクライアント）')
+    parser.add_argument('--sessions', type=int, default=200, help='実行するセッション数')
+    parser.add_argument('--concurrency', type=int, default=20, help='同時実行するセッション数')
+    parser.add_argument('--moves', type=int, default=20, help='1セッションあたりの入力数')
+    parser.add_argument('--hints', type=int, default=2, help='1セッションあたりのヒント数')
+    parser.add_argument('--seed', type=int, help='乱数シード')
+    parser.add_argument('--server-pid', type=int, help='メモリを計測するサーバーのPID（--url使用時）')
+    parser.add_argument('--report', help='JSONレポートの出力先')
+    args = parser.parse_args(argv)
+
+    if args.url:
+        make_transport = lambda: HttpTransport(args.url)
+        server_pid = args.server_pid
+    else:
+        from app import app
+        make_transport = lambda: TestClientTransport(app)
+        server_pid = None
+
+    report = run_load_test(make_transport, args.sessions, args.concurrency,
+                           args.moves, args.hints, args.seed, server_pid)
+    print_report(report, out=sys.stderr)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout)
+        print()
+
+    return 0 if report['errors'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,15 @@
 #!/usr/bin/env python3
-from sudoku import SudokuPuzzle
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from event_log import build_report, read_events
+from sudoku import SudokuPuzzle, BitmaskSolver, analyze_puzzle, parse_board, canonical_form
 
 
 class SudokuCLI:
@@ -27,18 +37,24 @@ class SudokuCLI:
         print("1. 簡単 (Easy)")
         print("2. 普通 (Medium)")  
         print("3. 難しい (Hard)")
+        print("4. エキスパート (Expert) - 点対称の最小問題")
+        print("5. エクストリーム (Extreme) - 最小問題")
         
         while True:
             try:
-                choice = input("選択 (1-3): ").strip()
+                choice = input("選択 (1-5): ").strip()
                 if choice == "1":
                     return "easy"
                 elif choice == "2":
                     return "medium"
                 elif choice == "3":
                     return "hard"
+                elif choice == "4":
+                    return "expert"
+                elif choice == "5":
+                    return "extreme"
                 else:
-                    print("1、2、3のいずれかを入力してください")
+                    print("1-5のいずれかを入力してください")
             except KeyboardInterrupt:
                 print("\nゲームを終了します")
                 return None
@@ -198,11 +214,211 @@ class SudokuCLI:
         self.running = False
 
 
-def main():
+def analyze_command(args):
+    """問題を解析して結果を表示"""
+    try:
+        board = parse_board(args.puzzle)
+    except ValueError as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 2
+
+    start_time = time.perf_counter()
+    result = analyze_puzzle(board, args.limit)
+    elapsed = time.perf_counter() - start_time
+
+    if args.json:
+        print(json.dumps(result))
+        return 0
+
+    count = f"{result['solutions']}個以上" if result['limit_reached'] else f"{result['solutions']}個"
+    print(f"解の個数: {count}")
+    print(f"手がかり: {result['clues']}個")
+    if result['solutions']:
+        fixed = sum(1 for row in result['backbone'] for num in row if num)
+        print(f"バックボーン（全ての解で共通のマス）: {fixed}マス")
+        SudokuPuzzle().display_board(result['backbone'])
+        redundant = ", ".join(f"({row + 1},{col + 1})" for row, col in result['redundant_clues'])
+        print(f"冗長な手がかり: {len(result['redundant_clues'])}個 {redundant}")
+    print(f"解析時間: {elapsed * 1000:.1f}ミリ秒")
+    return 0
+
+
+PUZZLE_CHARS = set('.0123456789')
+
+
+def parse_puzzle_line(line):
+    """81文字の問題を81要素のリストにする（不正ならNone）"""
+    line = line.strip()
+    if len(line) != 81 or not PUZZLE_CHARS.issuperset(line):
+        return None
+    return [0 if ch == '.' else ord(ch) - 48 for ch in line]
+
+
+def solve_lines(lines):
+    """各行の解（81文字）を返す。解けなければnone、不正な行はinvalid"""
+    results = []
+    for line in lines:
+        cells = parse_puzzle_line(line)
+        solver = BitmaskSolver(cells) if cells is not None else None
+        if solver is None or not solver.consistent:
+            results.append("invalid")
+            continue
+        solutions = []
+        solver.count(1, solutions.append)
+        results.append(''.join(map(str, solutions[0])) if solutions else "none")
+    return results
+
+
+def validate_lines(lines):
+    """各行の判定（unique / multiple / none / invalid）を返す"""
+    results = []
+    for line in lines:
+        cells = parse_puzzle_line(line)
+        solver = BitmaskSolver(cells) if cells is not None else None
+        if solver is None or not solver.consistent:
+            results.append("invalid")
+            continue
+        results.append(("none", "unique", "multiple")[solver.count(limit=2)])
+    return results
+
+
+def canonical_lines(lines):
+    """各行の正規形（対称変換で移り合う問題に共通の81文字）を返す"""
+    results = []
+    for line in lines:
+        cells = parse_puzzle_line(line)
+        if cells is None:
+            results.append("invalid")
+            continue
+        results.append(canonical_form([cells[i:i + 9] for i in range(0, 81, 9)]))
+    return results
+
+
+STREAM_COMMANDS = {
+    "solve": solve_lines,
+    "validate": validate_lines,
+    "canonical": canonical_lines
+}
+
+
+def stream_command(args):
+    """標準入力（またはファイル）の問題を1行ずつ処理して順番どおりに出力"""
+    handler = STREAM_COMMANDS[args.command]
+    source = sys.stdin if args.input in (None, "-") else open(args.input)
+    out = sys.stdout
+    workers = args.workers or os.cpu_count() or 1
+    window = args.window or workers * 4
+
+    lines = (line for line in source if line.strip())
+    chunks = iter(lambda: list(islice(lines, args.chunk_size)), [])
+
+    processed = 0
+    start_time = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start_time
+        rate = processed / elapsed if elapsed else 0.0
+        label = "完了" if final else "処理中"
+        print(f"{label}: {processed}問 {elapsed:.1f}秒 ({rate:.0f}問/秒)", file=sys.stderr)
+
+    try:
+        if workers == 1:
+            results = map(handler, chunks)
+            executor = None
+        else:
+            # 処理中のチャンクをwindow個までに抑えてメモリを一定にする
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = _ordered_window(executor, handler, chunks, window)
+
+        for chunk_results in results:
+            out.write("\n".join(chunk_results))
+            out.write("\n")
+            processed += len(chunk_results)
+            now = time.perf_counter()
+            if args.progress and now - last_report >= args.progress:
+                report()
+                last_report = now
+
+        if executor is not None:
+            executor.shutdown()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    out.flush()
+    report(final=True)
+    return 0
+
+
+def _ordered_window(executor, handler, chunks, window):
+    """チャンクを並列に処理し、入力順に結果を返す"""
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(handler, chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def events_command(args):
+    """イベントログを読んで難易度ごとの解答時間を表示"""
+    report = build_report(read_events(args.paths))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+        return 0
+
+    def seconds(value):
+        return "-" if value is None else f"{value:.0f}秒"
+
+    print(f"{'難易度':<10}{'開始':>7}{'正解':>7}{'正解率':>8}{'p25':>8}{'中央値':>8}{'p75':>8}{'p90':>8}{'ヒント':>7}")
+    for difficulty, r in report.items():
+        rate = "-" if r['solve_rate'] is None else f"{r['solve_rate']:.0%}"
+        hints = "-" if r['mean_hints'] is None else f"{r['mean_hints']:.1f}"
+        print(f"{difficulty:<10}{r['started']:>7}{r['solved']:>7}{rate:>8}{seconds(r['time_p25_s']):>8}"
+              f"{seconds(r['time_p50_s']):>8}{seconds(r['time_p75_s']):>8}{seconds(r['time_p90_s']):>8}{hints:>7}")
+    return 0
+
+
+def main(argv=None):
     """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="ナンプレ（数独）ゲーム")
+    subparsers = parser.add_subparsers(dest="command")
+
+    analyze_parser = subparsers.add_parser("analyze", help="問題の解の個数・バックボーン・冗長な手がかりを調べる")
+    analyze_parser.add_argument("puzzle", help="81文字の問題（空欄は0または.）")
+    analyze_parser.add_argument("--limit", type=int, default=2, help="数える解の個数の上限")
+    analyze_parser.add_argument("--json", action="store_true", help="JSONで出力する")
+
+    for name, help_text in [("solve", "問題を1行ずつ解いて解答を出力する"),
+                            ("validate", "問題を1行ずつ判定する（unique / multiple / none / invalid）"),
+                            ("canonical", "問題を1行ずつ正規形に変換する（重複の除去用）")]:
+        stream_parser = subparsers.add_parser(name, help=help_text)
+        stream_parser.add_argument("input", nargs="?", help="入力ファイル（省略または-で標準入力）")
+        stream_parser.add_argument("--workers", type=int, help="ワーカープロセス数（既定: CPU数）")
+        stream_parser.add_argument("--chunk-size", type=int, default=1000, help="1回にワーカーへ渡す行数")
+        stream_parser.add_argument("--window", type=int, help="同時に処理中にするチャンク数（既定: ワーカー数x4）")
+        stream_parser.add_argument("--progress", type=float, default=5.0,
+                                   help="標準エラーに進捗を出す間隔（秒、0で無効）")
+
+    events_parser = subparsers.add_parser("events", help="イベントログから難易度ごとの解答時間を集計する")
+    events_parser.add_argument("paths", nargs="+", help="ログディレクトリまたはログファイル")
+    events_parser.add_argument("--json", action="store_true", help="JSONで出力する")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "events":
+        return events_command(args)
+    if args.command == "analyze":
+        return analyze_command(args)
+    if args.command in STREAM_COMMANDS:
+        return stream_command(args)
+
     cli = SudokuCLI()
     cli.run()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,157 @@
+import cProfile
+import itertools
+import marshal
+import random
+import secrets
+import threading
+import time
+from collections import deque
+
+
+# 管理者がリクエストをプロファイルするときに付けるヘッダー（WSGIのenviron名）
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+
+class RequestProfiler:
+    """リクエストをcProfileで計測し、直近capacity件を保存するリングバッファ
+
+    管理者トークン（X-Profile-Tokenヘッダー）付きのリクエストと、sample_rateの割合で
+    無作為に選んだリクエストを計測します。cProfileは1度に1つしか動かせないので、
+    計測中に来たリクエストは計測しません。計測結果はトークンが無いと取り出せないので、
+    sample_rateを指定するときはtokenも必要です（無ければValueError）。
+    結果はcProfileの.prof形式（pstatsのdump_statsと同じ）で取り出せるので、
+    snakevizやflameprof、gprof2dotなどでそのままフレームグラフにできます。
+    """
+
+    # 計測中のリクエストであることをビューに伝えるenvironのキー
+    environ_key = 'sudoku.profile'
+
+    def __init__(self, token=None, sample_rate=0.0, capacity=20, skip_prefixes=(), skip_suffixes=()):
+        if sample_rate > 0 and not token:
+            raise ValueError("無作為に計測するときは管理者トークンも指定してください")
+        self.token = token
+        self.sample_rate = sample_rate
+        self.skip_prefixes = tuple(skip_prefixes)
+        self.skip_suffixes = tuple(skip_suffixes)
+        self._profiles = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+
+    def is_admin(self, token):
+        return bool(self.token and token) and secrets.compare_digest(token, self.token)
+
+    def wants(self, environ):
+        """このリクエストを計測するか"""
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(self.skip_prefixes) or path.endswith(self.skip_suffixes):
+            return False
+        # 終わらないストリーム（SSE）は計測しない（パスで除いていない分もAcceptで判断する）
+        if 'text/event-stream' in environ.get('HTTP_ACCEPT', ''):
+            return False
+        if self.is_admin(environ.get(TOKEN_HEADER)):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        """計測を始める（ほかのリクエストを計測中ならNone）"""
+        if not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, environ, status, seconds):
+        """計測を終えて保存し、プロファイルの番号を返す"""
+        try:
+            profile.disable()
+        finally:
+            self._active.release()
+        profile.create_stats()
+
+        entry = {
+            'id': next(self._ids),
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'status': status,
+            'duration_ms': round(seconds * 1000, 3),
+            'time': time.time(),
+            'sampled': not self.is_admin(environ.get(TOKEN_HEADER)),
+            'top': top_functions(profile.stats),
+        }
+        data = marshal.dumps(profile.stats)
+        entry['size'] = len(data)
+        with self._lock:
+            self._profiles.append((entry, data))
+        return entry['id']
+
+    def list(self):
+        """保存しているプロファイルの一覧（新しい順）"""
+        with self._lock:
+            return [entry for entry, _ in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        """.prof形式のデータ（無ければNone）"""
+        with self._lock:
+            for entry, data in self._profiles:
+                if entry['id'] == profile_id:
+                    return data
+        return None
+
+
+def top_functions(stats, limit=10):
+    """自身の実行時間（tottime）の長い関数（statsはcreate_stats後のProfile.stats）"""
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items():
+        rows.append({
+            'function': f"{filename}:{line}({name})",
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['tottime_ms'], reverse=True)
+    return rows[:limit]
+
+
+class ProfilerMiddleware:
+    """RequestProfilerで選んだリクエストをWSGIの入口から計測するミドルウェア
+
+    ルーティング・ビュー・JSONのシリアライズまでを含めて計測し、レスポンスに
+    X-Profile-Idヘッダーを付けます。プロファイルを有効にしたときだけ
+    app.wsgi_appをこれで包むので、無効なときのオーバーヘッドはありません。
+    """
+
+    def __init__(self, wsgi_app, profiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        if not self.profiler.wants(environ):
+            return self.wsgi_app(environ, start_response)
+        profile = self.profiler.start()
+        if profile is None:
+            return self.wsgi_app(environ, start_response)
+
+        environ[self.profiler.environ_key] = True
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+
+        started = time.perf_counter()
+        try:
+            app_iter = self.wsgi_app(environ, capture_start_response)
+            try:
+                body = b''.join(app_iter)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+        finally:
+            profile_id = self.profiler.finish(profile, environ, captured.get('status'),
+                                              time.perf_counter() - started)
+
+        headers = list(captured['headers']) + [('X-Profile-Id', str(profile_id))]
+        start_response(captured['status'], headers, captured['exc_info'])
+        return [body]
@@ -0,0 +1,194 @@
+import json
+import secrets
+import threading
+import time
+
+
+# 部屋コードに使う文字（読み間違えやすい0/O・1/Iは使わない）
+ROOM_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+class RaceRoom:
+    """同じ問題を何人かで解き合う対戦部屋
+
+    進み具合の更新（update）は状態を書き換えるだけで、配信はしません。
+    RaceHubがtickごとに変更のあった部屋だけpublishを呼び、状態をSSEの1イベント分の
+    バイト列に1回だけ変換して、待っている購読者全員を起こします。
+    購読者は同じバイト列をそのまま送るので、サーバーの負荷は手数×観戦者数ではなく
+    部屋の数とtickの回数で決まります。
+    """
+
+    def __init__(self, room_id, puzzle, max_players=8):
+        self.room_id = room_id
+        self.puzzle = puzzle
+        self.max_players = max_players
+        self.to_fill = sum(1 for row in puzzle.puzzle_board for num in row if num == 0)
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.players = {}
+        self.version = 0
+        self.payload = None
+        self.closed = False
+        self.subscribers = 0
+        self.publishes = 0
+        self._pending = False
+        self._cond = threading.Condition()
+        with self._cond:
+            self._publish()
+
+    def join(self, name):
+        """参加して選手番号を返す（満員ならValueError）"""
+        with self._cond:
+            if len(self.players) >= self.max_players:
+                raise ValueError("部屋が満員です")
+            player_id = len(self.players) + 1
+            while player_id in self.players:
+                player_id += 1
+            self.players[player_id] = {'id': player_id, 'name': name, 'filled': 0, 'finished_ms': None}
+            self._touch()
+            return player_id
+
+    def update(self, player_id, filled, finished_ms=None):
+        """選手の進み具合を書き換える（配信は次のtick）"""
+        with self._cond:
+            player = self.players.get(player_id)
+            if player is None:
+                return
+            if player['filled'] != filled or player['finished_ms'] != finished_ms:
+                player['filled'] = filled
+                player['finished_ms'] = finished_ms
+                self._touch()
+
+    def _touch(self):
+        self._pending = True
+        self.last_active = time.monotonic()
+
+    def snapshot(self):
+        """部屋の状態（ゴールした順、次に埋めたマスの多い順）"""
+        players = sorted(self.players.values(),
+                         key=lambda p: (p['finished_ms'] is None, p['finished_ms'] or 0, -p['filled'], p['id']))
+        return {
+            'room': self.room_id,
+            'version': self.version,
+            'difficulty': self.puzzle.difficulty,
+            'variant': self.puzzle.variant.name,
+            'to_fill': self.to_fill,
+            'closed': self.closed,
+            'players': [dict(player) for player in players],
+        }
+
+    def _publish(self):
+        self.version += 1
+        self.publishes += 1
+        self._pending = False
+        data = json.dumps(self.snapshot(), separators=(',', ':'), ensure_ascii=False)
+        self.payload = f"id: {self.version}\nevent: progress\ndata: {data}\n\n".encode()
+        self._cond.notify_all()
+
+    def publish(self):
+        """前回から変更があれば新しい状態を作って購読者を起こす（配信したらTrue）"""
+        with self._cond:
+            if not self._pending:
+                return False
+            self._publish()
+            return True
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._publish()
+
+    def wait(self, version, timeout):
+        """versionより新しい状態を待って(version, payload)を返す（timeoutならNone）"""
+        with self._cond:
+            if self.version <= version and not self.closed:
+                self._cond.wait_for(lambda: self.version > version or self.closed, timeout)
+            if self.version <= version:
+                return None
+            return self.version, self.payload
+
+
+class RaceHub:
+    """対戦部屋の一覧と、tickごとにまとめて配信するスレッド
+
+    tick秒ごとに変更のあった部屋だけを配信し、idle_timeout秒だれも動かず
+    購読者もいない部屋は閉じて削除します。
+    """
+
+    def __init__(self, tick=0.25, idle_timeout=3600.0, max_rooms=1000, heartbeat=15.0):
+        self.tick = tick
+        self.idle_timeout = idle_timeout
+        self.max_rooms = max_rooms
+        self.heartbeat = heartbeat
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self._ticker = None
+
+    def create(self, puzzle, max_players=8):
+        """部屋を作る（部屋が多すぎるときはValueError）"""
+        with self._lock:
+            if len(self._rooms) >= self.max_rooms:
+                raise ValueError("対戦部屋が多すぎます。しばらくしてから再度お試しください")
+            room_id = ''.join(secrets.choice(ROOM_ALPHABET) for _ in range(6))
+            while room_id in self._rooms:
+                room_id = ''.join(secrets.choice(ROOM_ALPHABET) for _ in range(6))
+            room = RaceRoom(room_id, puzzle, max_players)
+            self._rooms[room_id] = room
+        if self._ticker is None or not self._ticker.is_alive():
+            self._ticker = threading.Thread(target=self._tick_loop, daemon=True)
+            self._ticker.start()
+        return room
+
+    def get(self, room_id):
+        with self._lock:
+            return self._rooms.get(str(room_id or '').upper())
+
+    def update(self, room_id, player_id, filled, finished_ms=None):
+        room = self.get(room_id)
+        if room is not None:
+            room.update(player_id, filled, finished_ms)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rooms)
+
+    def publish_all(self):
+        """変更のあった部屋を配信し、放置された部屋を片付ける（配信した部屋の数を返す）"""
+        with self._lock:
+            rooms = list(self._rooms.values())
+        published = 0
+        now = time.monotonic()
+        for room in rooms:
+            if room.publish():
+                published += 1
+            elif room.subscribers == 0 and now - room.last_active > self.idle_timeout:
+                with self._lock:
+                    self._rooms.pop(room.room_id, None)
+                room.close()
+        return published
+
+    def _tick_loop(self):
+        stop = threading.Event()
+        while not stop.wait(self.tick):
+            self.publish_all()
+
+    def events(self, room, last_version=0):
+        """SSEのイベント列（状態が変わるたびに1つ、無ければheartbeat秒ごとにコメント行）"""
+        with room._cond:
+            room.subscribers += 1
+        try:
+            version = last_version
+            while True:
+                update = room.wait(version, self.heartbeat)
+                if update is None:
+                    if room.closed:
+                        return
+                    yield b": keepalive\n\n"
+                    continue
+                version, payload = update
+                yield payload
+                if room.closed:
+                    return
+        finally:
+            with room._cond:
+                room.subscribers -= 1
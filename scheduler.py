@@ -0,0 +1,204 @@
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+
+# 値が小さいほど先に作る（安い問題を待たせない）
+DEFAULT_PRIORITIES = {
+    "easy": 0,
+    "medium": 1,
+    "hard": 2,
+    "expert": 3,
+    "extreme": 4,
+}
+
+# 同時に作る数の上限（指定の無い難易度はワーカー数まで）
+DEFAULT_LIMITS = {
+    "expert": 1,
+    "extreme": 1,
+}
+
+
+class GenerationBusy(Exception):
+    """混み合っていて受け付けられない（retry_after秒後に再試行してほしい）"""
+
+    def __init__(self, retry_after):
+        super().__init__("混み合っています。しばらくしてから再度お試しください")
+        self.retry_after = retry_after
+
+
+class _Job:
+    def __init__(self, difficulty, priority, func, key, seq):
+        self.difficulty = difficulty
+        self.priority = priority
+        self.func = func
+        self.key = key
+        self.seq = seq
+        self.submitted = time.monotonic()
+        self.started = False
+        self.waiters = 1
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _percentile_ms(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+
+
+class GenerationScheduler:
+    """問題の生成をまとめて引き受けるスケジューラー
+
+    生成はworkers個のスレッドで行い、待ち行列はmax_queue件までです。あふれたときや
+    timeout秒待っても始まらないときはGenerationBusyを投げるので、クライアントには
+    すぐに「混み合っています」を返せます（始まった生成は結果を捨てずに終わるまで待ちます）。
+    待ち行列からは優先度（難易度）の高いものを、
+    難易度ごとの同時実行数の上限を超えない範囲で取り出します。
+    coalesce_keyが同じ依頼（同じseedの日替わり問題など）は1回だけ生成して結果を共有します。
+    """
+
+    def __init__(self, workers=2, max_queue=64, timeout=10.0, priorities=None, limits=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.priorities = priorities or DEFAULT_PRIORITIES
+        self.limits = limits or DEFAULT_LIMITS
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._running = {}
+        self._coalescing = {}
+        self._threads = []
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=1000)
+        self._runs = deque(maxlen=1000)
+        self.completed = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.timed_out = 0
+
+    def run(self, difficulty, func, coalesce_key=None, timeout=None):
+        """funcを生成用のスレッドで実行して結果を返す（timeout秒以内に始まらなければGenerationBusy）"""
+        job = self._submit(difficulty, func, coalesce_key)
+        if not job.done.wait(self.timeout if timeout is None else timeout):
+            with self._cond:
+                if not job.started:
+                    # 始まらなかった依頼だけを取り下げる
+                    job.waiters -= 1
+                    if job.waiters == 0:
+                        self._queue.remove(job)
+                        self._forget(job)
+                    self.timed_out += 1
+                    raise GenerationBusy(self._retry_after())
+            # 生成が始まっていれば結果を捨てずに終わるまで待つ
+            job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _submit(self, difficulty, func, key):
+        if difficulty not in self.priorities:
+            difficulty = "other"
+        with self._cond:
+            if key is not None and key in self._coalescing:
+                job = self._coalescing[key]
+                job.waiters += 1
+                self.coalesced += 1
+                return job
+
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise GenerationBusy(self._retry_after())
+
+            job = _Job(difficulty, self.priorities.get(difficulty, len(self.priorities)), func, key, next(self._seq))
+            self._queue.append(job)
+            if key is not None:
+                self._coalescing[key] = job
+            self._ensure_workers()
+            self._cond.notify_all()
+            return job
+
+    def _ensure_workers(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work_loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _forget(self, job):
+        if job.key is not None and self._coalescing.get(job.key) is job:
+            del self._coalescing[job.key]
+
+    def _next_job(self):
+        """上限に達していない難易度の中で最も優先度の高い依頼（待ち行列は短いので線形に探す）"""
+        best = None
+        for job in self._queue:
+            if self._running.get(job.difficulty, 0) >= self.limits.get(job.difficulty, self.workers):
+                continue
+            if best is None or (job.priority, job.seq) < (best.priority, best.seq):
+                best = job
+        if best is not None:
+            self._queue.remove(best)
+        return best
+
+    def _work_loop(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                job.started = True
+                self._running[job.difficulty] = self._running.get(job.difficulty, 0) + 1
+                started = time.monotonic()
+                self._waits.append(started - job.submitted)
+
+            try:
+                job.result = job.func()
+            except Exception as e:
+                job.error = e
+
+            with self._cond:
+                self._running[job.difficulty] -= 1
+                self._runs.append(time.monotonic() - started)
+                self.completed += 1
+                self._forget(job)
+                self._cond.notify_all()
+            job.done.set()
+
+    def _retry_after(self):
+        """待ち行列が掃けるまでの見積もり（秒、1〜30）"""
+        average = sum(self._runs) / len(self._runs) if self._runs else 0.1
+        estimate = (len(self._queue) + 1) * average / max(self.workers, 1)
+        return max(1, min(30, math.ceil(estimate)))
+
+    def stats(self):
+        """待ち行列の長さ・実行中の数・待ち時間と生成時間の分布"""
+        with self._cond:
+            difficulties = sorted(set(self._running) | {job.difficulty for job in self._queue})
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue': self.max_queue,
+                'workers': self.workers,
+                'running': sum(self._running.values()),
+                'by_difficulty': {
+                    difficulty: {
+                        'queued': sum(1 for job in self._queue if job.difficulty == difficulty),
+                        'running': self._running.get(difficulty, 0),
+                    }
+                    for difficulty in difficulties
+                },
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'coalesced': self.coalesced,
+                'timed_out': self.timed_out,
+                'wait_ms_p50': _percentile_ms(self._waits, 50),
+                'wait_ms_p90': _percentile_ms(self._waits, 90),
+                'run_ms_p50': _percentile_ms(self._runs, 50),
+                'run_ms_p90': _percentile_ms(self._runs, 90),
+            }
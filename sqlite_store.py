@@ -0,0 +1,316 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from sudoku import CLASSIC, Variant, board_to_string, string_to_board
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    solution TEXT NOT NULL,
+    puzzle TEXT NOT NULL,
+    user_board TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    variant TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL DEFAULT ''
+) WITHOUT ROWID
+"""
+
+# 古いデータベースに後から足した列（名前, 型）
+ADDED_COLUMNS = (
+    ('variant', "TEXT NOT NULL DEFAULT ''"),
+    ('state', "TEXT NOT NULL DEFAULT ''"),
+)
+
+INSERT_GAME = ("INSERT OR REPLACE INTO games "
+               "(game_id, solution, puzzle, user_board, version, updated_at, variant, state) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+SELECT_GAME = "SELECT solution, puzzle, user_board, version, variant, state FROM games WHERE game_id = ?"
+SELECT_VERSION = "SELECT version FROM games WHERE game_id = ?"
+SELECT_BOARD = "SELECT user_board, state, version FROM games WHERE game_id = ?"
+# 読み込んだときのバージョンのままなら書き込む（他のワーカーが先に書いていれば0行）
+UPDATE_BOARD = ("UPDATE games SET user_board = ?, state = ?, version = version + 1, updated_at = ? "
+                "WHERE game_id = ? AND version = ?")
+DELETE_GAME = "DELETE FROM games WHERE game_id = ?"
+COUNT_GAMES = "SELECT COUNT(*) FROM games"
+
+
+class _CachedGame:
+    """プロセス内にキャッシュしたゲームとロック・バージョン
+
+    versionはキャッシュの盤面のもとになったデータベースのバージョンです
+    （-1なら次にアクセスしたときに読み直す）。
+    """
+
+    def __init__(self, puzzle, version):
+        self.puzzle = puzzle
+        self.version = version
+        self.lock = threading.RLock()
+
+
+def merge_board(base, changed, current):
+    """baseからchangedで変えたマスだけをcurrentに当てはめる（81文字の盤面）"""
+    return ''.join(c if c != b else cur for b, c, cur in zip(base, changed, current))
+
+
+def dump_state(puzzle):
+    """難易度・開始時刻などの状態を保存用のJSONにする"""
+    return json.dumps(puzzle.state_dict(), separators=(',', ':'), ensure_ascii=False)
+
+
+def dump_variant(variant):
+    """変則ルールを保存用のJSONにする（通常のルールは空文字列）"""
+    if variant is CLASSIC:
+        return ''
+    return json.dumps(variant.to_dict(), separators=(',', ':'))
+
+
+class SQLiteGameStore:
+    """SQLite（WALモード）にゲームを保存し、ワーカープロセス間で共有する
+
+    盤面は81文字の数字列、変則ルールと難易度・開始時刻などの状態はJSONで保存します。接続はプロセスごとにpool_size本までをプールして
+    使い回し、SQL文は固定文字列にしてsqlite3のプリペアドステートメントキャッシュを効かせます。
+    手の反映はメモリ上のキャッシュに行い、書き込みはバックグラウンドのスレッドが
+    flush_intervalごと（またはbatch_size件たまったとき）にまとめて行います。
+
+    書き込みは読み込んだときのバージョンのままの行だけを更新します。他のワーカーが
+    先に書き込んでいたときは、最新の盤面にこちらで変えたマスだけを当てはめて書き直し、
+    キャッシュは次のアクセスで読み直すので、どのワーカーも同じ盤面にそろいます。
+    """
+
+    def __init__(self, path, puzzle_factory, flush_interval=0.02, batch_size=256, pool_size=8):
+        self.path = path
+        self.puzzle_factory = puzzle_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+
+        self._reset_process_state()
+
+        with self._connection() as conn:
+            conn.execute(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(games)")}
+            for name, definition in ADDED_COLUMNS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE games ADD COLUMN {name} {definition}")
+        atexit.register(self.flush)
+
+    def _reset_process_state(self):
+        # fork後の子プロセスでは親のキャッシュ・接続・書き込みスレッドを引き継がない
+        self._pid = os.getpid()
+        self._pool = queue.LifoQueue()
+        self._pool_created = 0
+        self._pool_lock = threading.Lock()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._dirty = {}
+        self._dirty_cond = threading.Condition()
+        self._writer = None
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            self._reset_process_state()
+
+    @contextmanager
+    def _connection(self):
+        """プールから接続を借りる（空きが無ければpool_size本まで作り、それ以上は返却を待つ）"""
+        self._check_process()
+        pool = self._pool
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._pool_created < self.pool_size
+                if create:
+                    self._pool_created += 1
+            if create:
+                conn = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                                       check_same_thread=False, cached_statements=64)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            else:
+                conn = pool.get()
+        try:
+            yield conn
+        finally:
+            pool.put(conn)
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            with self._dirty_cond:
+                if len(self._dirty) < self.batch_size:
+                    self._dirty_cond.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """溜まっている盤面の更新を1トランザクションで書き込む"""
+        self._check_process()
+        with self._dirty_cond:
+            if not self._dirty:
+                return 0
+            pending, self._dirty = self._dirty, {}
+            # 書き込みが通ればデータベースは1つ進む（この後の変更はそれをもとにする）
+            with self._cache_lock:
+                entries = {game_id: self._cache.get(game_id) for game_id in pending}
+            for game_id, (base_version, _, _) in pending.items():
+                if entries[game_id] is not None:
+                    entries[game_id].version = base_version + 1
+
+        now = time.time()
+        conflicts = []
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for game_id, (base_version, base, changed) in pending.items():
+                    board, state = changed
+                    if conn.execute(UPDATE_BOARD, (board, state, now, game_id, base_version)).rowcount:
+                        continue
+                    # 他のワーカーが先に書き込んでいた：最新の盤面に自分の変更を当てはめる
+                    row = conn.execute(SELECT_BOARD, (game_id,)).fetchone()
+                    if row is None:
+                        continue
+                    current_board, current_state, version = row
+                    if state == base[1]:
+                        state = current_state
+                    conn.execute(UPDATE_BOARD, (merge_board(base[0], board, current_board), state, now,
+                                                game_id, version))
+                    conflicts.append(game_id)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                # 書き込めなかった分は新しい更新が無ければ戻しておく
+                with self._dirty_cond:
+                    for game_id, value in pending.items():
+                        self._dirty.setdefault(game_id, value)
+                        if entries[game_id] is not None:
+                            entries[game_id].version = value[0]
+                raise
+
+        # 他のワーカーの変更を取り込んだゲームは次のアクセスで読み直す
+        with self._dirty_cond:
+            for game_id in conflicts:
+                if entries[game_id] is not None and game_id not in self._dirty:
+                    entries[game_id].version = -1
+        return len(pending)
+
+    def _load(self, game_id):
+        with self._connection() as conn:
+            row = conn.execute(SELECT_GAME, (game_id,)).fetchone()
+        if row is None:
+            return None
+        solution, puzzle_board, user_board, version, variant, state = row
+        puzzle = self.puzzle_factory()
+        puzzle.complete_board = string_to_board(solution)
+        puzzle.puzzle_board = string_to_board(puzzle_board)
+        puzzle.user_board = string_to_board(user_board)
+        if variant:
+            puzzle.variant = Variant.from_dict(json.loads(variant))
+        if state:
+            puzzle.restore_state(json.loads(state))
+        return puzzle, version
+
+    def _entry(self, game_id):
+        with self._cache_lock:
+            entry = self._cache.get(game_id)
+        if entry is not None:
+            return entry
+
+        loaded = self._load(game_id)
+        if loaded is None:
+            return None
+        with self._cache_lock:
+            return self._cache.setdefault(game_id, _CachedGame(*loaded))
+
+    def __setitem__(self, game_id, puzzle):
+        with self._connection() as conn:
+            conn.execute(INSERT_GAME, (
+                game_id,
+                board_to_string(puzzle.complete_board),
+                board_to_string(puzzle.puzzle_board),
+                board_to_string(puzzle.user_board),
+                0,
+                time.time(),
+                dump_variant(puzzle.variant),
+                dump_state(puzzle)))
+        with self._cache_lock:
+            self._cache[game_id] = _CachedGame(puzzle, 0)
+
+    def __getitem__(self, game_id):
+        entry = self._entry(game_id)
+        if entry is None:
+            raise KeyError(game_id)
+        return entry.puzzle
+
+    def __delitem__(self, game_id):
+        with self._cache_lock:
+            self._cache.pop(game_id, None)
+        with self._dirty_cond:
+            self._dirty.pop(game_id, None)
+        with self._connection() as conn:
+            conn.execute(DELETE_GAME, (game_id,))
+
+    def __contains__(self, game_id):
+        with self._cache_lock:
+            if game_id in self._cache:
+                return True
+        with self._connection() as conn:
+            return conn.execute(SELECT_VERSION, (game_id,)).fetchone() is not None
+
+    def __len__(self):
+        self.flush()
+        with self._connection() as conn:
+            return conn.execute(COUNT_GAMES).fetchone()[0]
+
+    def get(self, game_id, default=None):
+        entry = self._entry(game_id)
+        return default if entry is None else entry.puzzle
+
+    @contextmanager
+    def locked(self, game_id):
+        """ゲームのロックを取った状態でパズルを渡す（見つからなければNone）"""
+        entry = self._entry(game_id) if game_id else None
+        if entry is None:
+            yield None
+            return
+
+        with entry.lock:
+            # 他のワーカーが書き込んだ新しい盤面があれば読み直す
+            with self._connection() as conn:
+                row = conn.execute(SELECT_VERSION, (game_id,)).fetchone()
+            if row is None:
+                yield None
+                return
+            with self._dirty_cond:
+                stale = row[0] > entry.version and game_id not in self._dirty
+            if stale:
+                loaded = self._load(game_id)
+                if loaded is not None:
+                    with self._dirty_cond:
+                        if game_id not in self._dirty:
+                            entry.puzzle, entry.version = loaded
+
+            # 盤面と状態（解答時間・記録済みかなど）のどちらかが変われば書き込む
+            before = (board_to_string(entry.puzzle.user_board), dump_state(entry.puzzle))
+            yield entry.puzzle
+            after = (board_to_string(entry.puzzle.user_board), dump_state(entry.puzzle))
+
+            if after != before:
+                with self._dirty_cond:
+                    # まだ書き込んでいない変更があれば、そのもとの盤面とバージョンを引き継ぐ
+                    base_version, base, _ = self._dirty.get(game_id, (entry.version, before, None))
+                    self._dirty[game_id] = (base_version, base, after)
+                    if len(self._dirty) >= self.batch_size:
+                        self._dirty_cond.notify()
+                self._ensure_writer()
@@ -5,6 +5,31 @@ class SudokuWebApp {
         this.puzzleBoard = null;
         this.userBoard = null;
         
+        // クライアント側検証モード（solution / hashed）用の状態
+        // ランキングに載るのはserverモードのゲームだけなので、hashedは練習用
+        this.localValidation = (window.crypto && window.crypto.subtle) ? 'hashed' : 'server';
+        this.solution = null;
+        this.solutionHashes = null;
+        this.salt = null;
+        this.dirtyMoves = 0;
+        this.syncTimer = null;
+        
+        // 候補（メモ）表示
+        this.showNotes = false;
+        this.candidates = null;
+        
+        // ルール（対角線・ハイパー・キラーのケージ）
+        this.variant = { type: 'classic', cages: [] };
+        
+        // ランキング
+        this.difficulty = null;
+        this.daily = null;
+        
+        // 対戦（SSEで部屋の進み具合を受け取る）
+        this.raceRoom = null;
+        this.racePlayer = null;
+        this.raceEvents = null;
+        
         this.initializeEventListeners();
         this.createBoard();
     }
@@ -38,6 +63,22 @@ class SudokuWebApp {
             this.getHint();
         });
 
+        // 対戦（部屋を作る・部屋コードで参加）
+        document.getElementById('race-create-btn').addEventListener('click', () => {
+            this.startRace();
+        });
+        document.getElementById('race-join-btn').addEventListener('click', () => {
+            const code = document.getElementById('race-code').value.trim().toUpperCase();
+            if (code) {
+                this.startRace(code);
+            }
+        });
+
+        // メモ（候補）表示ボタン
+        document.getElementById('notes-btn').addEventListener('click', () => {
+            this.toggleNotes();
+        });
+
         // キーボード入力
         document.addEventListener('keydown', (e) => {
             if (e.key >= '1' && e.key <= '9') {
@@ -59,8 +100,8 @@ class SudokuWebApp {
                 cell.setAttribute('data-row', row);
                 cell.setAttribute('data-col', col);
                 
-                cell.addEventListener('click', (e) => {
-                    this.selectCell(e.target);
+                cell.addEventListener('click', () => {
+                    this.selectCell(cell);
                 });
 
                 boardElement.appendChild(cell);
@@ -79,8 +120,11 @@ class SudokuWebApp {
         this.selectedCell = cell;
     }
 
-    async startNewGame() {
+    async startNewGame(attempt = 0) {
         const difficulty = document.getElementById('difficulty').value;
+        const variant = document.getElementById('variant').value;
+        const daily = document.getElementById('daily').checked;
+        const ranked = daily || document.getElementById('ranked').checked;
         this.showMessage('新しいゲームを生成中...', 'info');
 
         try {
@@ -88,18 +132,30 @@ class SudokuWebApp {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'X-Board-Encoding': SudokuWebApp.BOARD_ENCODING,
                 },
                 body: JSON.stringify({
-                    difficulty: difficulty
+                    difficulty: difficulty,
+                    variant: variant,
+                    validation: ranked ? 'server' : this.localValidation,
+                    name: document.getElementById('player-name').value,
+                    daily: daily
                 })
             });
 
             const data = await response.json();
 
+            if (data.busy && attempt < SudokuWebApp.MAX_BUSY_RETRIES) {
+                // 混み合っているときはRetry-Afterの秒数だけ待って再試行
+                const seconds = parseInt(response.headers.get('Retry-After')) || data.retry_after || 1;
+                this.showMessage(`混み合っています。${seconds}秒後に再試行します...`, 'info');
+                setTimeout(() => this.startNewGame(attempt + 1), seconds * 1000);
+                return;
+            }
+
             if (data.success) {
-                this.puzzleBoard = data.puzzle;
-                this.userBoard = data.user_board;
-                this.updateBoard();
+                this.leaveRace();
+                this.loadGame(data);
                 this.showMessage(`${difficulty.toUpperCase()}難易度の新しいゲームを開始しました！`, 'success');
             } else {
                 this.showMessage('ゲーム生成エラー: ' + data.error, 'error');
@@ -109,6 +165,94 @@ class SudokuWebApp {
         }
     }
 
+    loadGame(data) {
+        this.puzzleBoard = this.decodeBoard(data.puzzle);
+        this.userBoard = this.decodeBoard(data.user_board);
+        this.solution = data.solution ? this.decodeBoard(data.solution) : null;
+        this.solutionHashes = data.solution_hashes || null;
+        this.salt = data.salt || null;
+        this.dirtyMoves = 0;
+        this.candidates = null;
+        this.variant = data.variant || { type: 'classic', cages: [] };
+        this.difficulty = data.difficulty;
+        this.daily = data.daily || null;
+        this.applyVariant();
+        this.refreshLeaderboard();
+        this.updateBoard();
+        this.refreshCandidates();
+    }
+
+    async startRace(roomCode = null) {
+        // roomCodeが無ければ部屋を作り、あればその部屋に参加する
+        const url = roomCode ? `/game/race/${encodeURIComponent(roomCode)}/join` : '/game/race/create';
+        this.showMessage(roomCode ? '対戦部屋に参加しています...' : '対戦部屋を作成中...', 'info');
+
+        try {
+            const response = await fetch(url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-Board-Encoding': SudokuWebApp.BOARD_ENCODING,
+                },
+                body: JSON.stringify({
+                    difficulty: document.getElementById('difficulty').value,
+                    variant: document.getElementById('variant').value,
+                    name: document.getElementById('player-name').value
+                })
+            });
+            const data = await response.json();
+
+            if (!data.success) {
+                this.showMessage('対戦エラー: ' + data.error, 'error');
+                return;
+            }
+            this.leaveRace();
+            this.loadGame(data);
+            this.raceRoom = data.room;
+            this.racePlayer = data.player_id;
+            document.getElementById('race-code').value = data.room;
+            this.raceEvents = new EventSource(`/game/race/${data.room}/events`);
+            this.raceEvents.addEventListener('progress', (e) => this.renderRace(JSON.parse(e.data)));
+            this.showMessage(`対戦部屋 ${data.room} に参加しました。部屋コードを友達に伝えてください`, 'success');
+        } catch (error) {
+            this.showMessage('サーバーエラー: ' + error.message, 'error');
+        }
+    }
+
+    leaveRace() {
+        if (this.raceEvents) {
+            this.raceEvents.close();
+        }
+        this.raceEvents = null;
+        this.raceRoom = null;
+        this.racePlayer = null;
+        document.getElementById('race-players').innerHTML = '';
+        document.getElementById('race-status').textContent = '';
+    }
+
+    renderRace(state) {
+        // サーバーがtickごとにまとめて送ってくる部屋の状態（ゴール順・進み具合順）
+        const list = document.getElementById('race-players');
+        list.innerHTML = '';
+        state.players.forEach(player => {
+            const item = document.createElement('li');
+            const progress = player.finished_ms !== null
+                ? `ゴール ${this.formatTime(player.finished_ms)}`
+                : `${player.filled} / ${state.to_fill}`;
+            item.textContent = `${player.name} ${progress}`;
+            if (player.id === this.racePlayer) {
+                item.classList.add('me');
+            }
+            list.appendChild(item);
+        });
+        document.getElementById('race-status').textContent = state.closed
+            ? '対戦部屋は閉じられました'
+            : `部屋 ${state.room} - ${state.players.length}人`;
+        if (state.closed && this.raceEvents) {
+            this.raceEvents.close();
+        }
+    }
+
     updateBoard() {
         const cells = document.querySelectorAll('.sudoku-cell');
         
@@ -117,7 +261,7 @@ class SudokuWebApp {
             const col = index % 9;
             
             // スタイルをリセット
-            cell.classList.remove('given', 'user-input');
+            cell.classList.remove('given', 'user-input', 'has-notes');
             
             const puzzleValue = this.puzzleBoard[row][col];
             const userValue = this.userBoard[row][col];
@@ -130,13 +274,97 @@ class SudokuWebApp {
                 // ユーザーが入力した数字
                 cell.textContent = userValue;
                 cell.classList.add('user-input');
+            } else if (this.showNotes && this.candidates) {
+                // 空欄に候補を小さく表示
+                cell.textContent = '';
+                cell.classList.add('has-notes');
+                const notes = document.createElement('div');
+                notes.className = 'notes';
+                const mask = this.candidates[index];
+                for (let num = 1; num <= 9; num++) {
+                    const note = document.createElement('span');
+                    note.textContent = (mask & (1 << (num - 1))) ? num : '';
+                    notes.appendChild(note);
+                }
+                cell.appendChild(notes);
             } else {
                 // 空欄
                 cell.textContent = '';
             }
+            
+            // キラーのケージの合計
+            if (this.cageSums && this.cageSums[index]) {
+                const sum = document.createElement('span');
+                sum.className = 'cage-sum';
+                sum.textContent = this.cageSums[index];
+                cell.appendChild(sum);
+            }
         });
     }
 
+    applyVariant() {
+        // ルールに応じて対角線・窓・ケージの線を引く
+        const cells = document.querySelectorAll('.sudoku-cell');
+        const cageOf = new Array(81).fill(-1);
+        this.cageSums = new Array(81).fill(0);
+        this.variant.cages.forEach((cage, n) => {
+            cage.cells.forEach(([row, col]) => { cageOf[row * 9 + col] = n; });
+            const [row, col] = cage.cells[0];
+            this.cageSums[row * 9 + col] = cage.sum;
+        });
+
+        cells.forEach((cell, index) => {
+            const row = Math.floor(index / 9);
+            const col = index % 9;
+            // ハイパーの窓は行・列1-3と5-7
+            const inWindow = row % 4 !== 0 && col % 4 !== 0;
+            const cage = cageOf[index];
+
+            cell.classList.toggle('diagonal-cell', this.variant.type === 'diagonal' && (row === col || row + col === 8));
+            cell.classList.toggle('hyper-cell', this.variant.type === 'hyper' && inWindow);
+            cell.classList.toggle('in-cage', cage >= 0);
+            cell.classList.toggle('cage-top', cage >= 0 && (row === 0 || cageOf[index - 9] !== cage));
+            cell.classList.toggle('cage-bottom', cage >= 0 && (row === 8 || cageOf[index + 9] !== cage));
+            cell.classList.toggle('cage-left', cage >= 0 && (col === 0 || cageOf[index - 1] !== cage));
+            cell.classList.toggle('cage-right', cage >= 0 && (col === 8 || cageOf[index + 1] !== cage));
+        });
+    }
+
+    toggleNotes() {
+        this.showNotes = !this.showNotes;
+        document.getElementById('notes-btn').classList.toggle('active', this.showNotes);
+        if (this.showNotes) {
+            this.refreshCandidates();
+        } else {
+            this.updateBoard();
+        }
+    }
+
+    async refreshCandidates() {
+        if (!this.showNotes || !this.userBoard) {
+            return;
+        }
+
+        // 候補はサーバーの盤面から求めるので、先に同期しておく
+        await this.syncBoard(false);
+
+        try {
+            const response = await fetch('/game/candidates?encoding=string');
+            const data = await response.json();
+
+            if (data.success) {
+                // 1マス3桁の16進数
+                this.candidates = [];
+                for (let i = 0; i < 81; i++) {
+                    this.candidates.push(parseInt(data.candidates.substr(i * 3, 3), 16));
+                }
+                this.updateBoard();
+            }
+        } catch (error) {
+            this.showMessage('サーバーエラー: ' + error.message, 'error');
+        }
+    }
+
     async inputNumber(num) {
         if (!this.selectedCell || !this.userBoard) {
             this.showMessage('セルを選択するか、新しいゲームを開始してください', 'error');
@@ -146,11 +374,17 @@ class SudokuWebApp {
         const row = parseInt(this.selectedCell.getAttribute('data-row'));
         const col = parseInt(this.selectedCell.getAttribute('data-col'));
 
+        if (this.isLocalMode()) {
+            this.applyLocalMove(row, col, num);
+            return;
+        }
+
         try {
             const response = await fetch('/game/make_move', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'X-Board-Encoding': SudokuWebApp.BOARD_ENCODING,
                 },
                 body: JSON.stringify({
                     row: row,
@@ -162,8 +396,9 @@ class SudokuWebApp {
             const data = await response.json();
 
             if (data.success) {
-                this.userBoard = data.user_board;
+                this.userBoard = this.decodeBoard(data.user_board);
                 this.updateBoard();
+                this.refreshCandidates();
                 this.showMessage(data.message, 'success');
             } else {
                 this.showMessage(data.error || data.message, 'error');
@@ -182,11 +417,17 @@ class SudokuWebApp {
         const row = parseInt(this.selectedCell.getAttribute('data-row'));
         const col = parseInt(this.selectedCell.getAttribute('data-col'));
 
+        if (this.isLocalMode()) {
+            this.applyLocalMove(row, col, 0);
+            return;
+        }
+
         try {
             const response = await fetch('/game/clear_cell', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'X-Board-Encoding': SudokuWebApp.BOARD_ENCODING,
                 },
                 body: JSON.stringify({
                     row: row,
@@ -197,8 +438,9 @@ class SudokuWebApp {
             const data = await response.json();
 
             if (data.success) {
-                this.userBoard = data.user_board;
+                this.userBoard = this.decodeBoard(data.user_board);
                 this.updateBoard();
+                this.refreshCandidates();
                 this.showMessage(data.message, 'success');
             } else {
                 this.showMessage(data.error || data.message, 'error');
@@ -214,6 +456,11 @@ class SudokuWebApp {
             return;
         }
 
+        if (this.isLocalMode()) {
+            await this.checkLocalSolution();
+            return;
+        }
+
         try {
             const response = await fetch('/game/check_solution', {
                 method: 'POST',
@@ -226,8 +473,9 @@ class SudokuWebApp {
 
             if (data.success) {
                 if (data.is_correct) {
-                    this.showMessage(data.message + ' 🎉', 'success');
+                    this.showMessage(data.message + ' 🎉' + this.rankMessage(data.ranks), 'success');
                     this.celebrateWin();
+                    this.refreshLeaderboard();
                 } else {
                     this.showMessage(data.message, 'error');
                 }
@@ -245,6 +493,9 @@ class SudokuWebApp {
             return;
         }
 
+        // ヒントはサーバーの盤面を使うので、先に同期しておく
+        await this.syncBoard(false);
+
         try {
             const response = await fetch('/game/get_hint', {
                 method: 'POST',
@@ -265,6 +516,186 @@ class SudokuWebApp {
         }
     }
 
+    decodeBoard(value) {
+        // json（9x9の配列）・string（81文字）・packed（4ビットずつ詰めたbase64）に対応
+        if (Array.isArray(value)) {
+            return value;
+        }
+
+        let cells;
+        if (value.length === 81) {
+            cells = Array.from(value, ch => ch === '.' ? 0 : parseInt(ch));
+        } else {
+            cells = [];
+            const bytes = atob(value);
+            for (let i = 0; i < bytes.length; i++) {
+                const byte = bytes.charCodeAt(i);
+                cells.push(byte >> 4, byte & 0x0F);
+            }
+        }
+
+        const board = [];
+        for (let row = 0; row < 9; row++) {
+            board.push(cells.slice(row * 9, row * 9 + 9));
+        }
+        return board;
+    }
+
+    encodeBoard(board) {
+        return board.map(row => row.join('')).join('');
+    }
+
+    isLocalMode() {
+        return this.solution !== null || this.solutionHashes !== null;
+    }
+
+    applyLocalMove(row, col, num) {
+        // サーバーを待たずに盤面を更新する
+        if (this.puzzleBoard[row][col] !== 0) {
+            this.showMessage('このセルは変更できません', 'error');
+            return;
+        }
+
+        this.userBoard[row][col] = num;
+        this.updateBoard();
+        this.refreshCandidates();
+        this.showMessage(num === 0 ? 'セルがクリアされました' : '手が記録されました', 'success');
+
+        this.dirtyMoves++;
+        if (this.dirtyMoves >= SudokuWebApp.SYNC_EVERY_MOVES) {
+            this.syncBoard(false);
+        } else if (!this.syncTimer) {
+            this.syncTimer = setTimeout(() => this.syncBoard(false), SudokuWebApp.SYNC_INTERVAL_MS);
+        }
+
+        if (this.userBoard.every(r => r.every(v => v !== 0))) {
+            this.checkLocalSolution();
+        }
+    }
+
+    async cellHash(index, num) {
+        const bytes = new TextEncoder().encode(`${this.salt}:${index}:${num}`);
+        const digest = await crypto.subtle.digest('SHA-256', bytes);
+        return Array.from(new Uint8Array(digest))
+            .map(b => b.toString(16).padStart(2, '0'))
+            .join('')
+            .slice(0, 16);
+    }
+
+    async isLocallySolved() {
+        for (let row = 0; row < 9; row++) {
+            for (let col = 0; col < 9; col++) {
+                const value = this.userBoard[row][col];
+                if (this.solution) {
+                    if (value !== this.solution[row][col]) return false;
+                } else if (await this.cellHash(row * 9 + col, value) !== this.solutionHashes[row * 9 + col]) {
+                    return false;
+                }
+            }
+        }
+        return true;
+    }
+
+    async checkLocalSolution() {
+        if (this.userBoard.some(r => r.some(v => v === 0))) {
+            this.showMessage('まだ空欄があります', 'error');
+            return;
+        }
+
+        const solved = await this.isLocallySolved();
+        if (solved) {
+            this.showMessage('正解です！おめでとうございます！ 🎉', 'success');
+            this.celebrateWin();
+        } else {
+            this.showMessage('間違いがあります。再度確認してください。', 'error');
+        }
+
+        // 最終盤面をサーバーに送る
+        await this.syncBoard(true);
+    }
+
+    async syncBoard(final) {
+        if (this.syncTimer) {
+            clearTimeout(this.syncTimer);
+            this.syncTimer = null;
+        }
+        if (!this.isLocalMode() || (this.dirtyMoves === 0 && !final)) {
+            return;
+        }
+
+        const moves = this.dirtyMoves;
+        this.dirtyMoves = 0;
+
+        try {
+            const response = await fetch('/game/sync_board', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    board: this.encodeBoard(this.userBoard),
+                    final: final
+                })
+            });
+
+            const data = await response.json();
+            if (!data.success) {
+                this.showMessage(data.error || data.message, 'error');
+            } else if (data.is_correct && data.ranks && data.ranks.length) {
+                this.showMessage('正解です！おめでとうございます！ 🎉' + this.rankMessage(data.ranks), 'success');
+                this.refreshLeaderboard();
+            }
+        } catch (error) {
+            // 失敗した分は次回の同期で再送する
+            this.dirtyMoves += moves;
+        }
+    }
+
+    formatTime(ms) {
+        const seconds = Math.floor(ms / 1000);
+        return `${Math.floor(seconds / 60)}:${String(seconds % 60).padStart(2, '0')}`;
+    }
+
+    rankMessage(ranks) {
+        // 最後のランキング（今日の問題ならその日のランキング）の順位を表示
+        if (!ranks || !ranks.length) {
+            return '';
+        }
+        const r = ranks[ranks.length - 1];
+        return ` ${this.formatTime(r.time_ms)} - ${r.rank}位 / ${r.total}人`;
+    }
+
+    async refreshLeaderboard() {
+        if (!this.difficulty) {
+            return;
+        }
+        const params = new URLSearchParams({ difficulty: this.difficulty, variant: this.variant.type, limit: 10 });
+        if (this.daily) {
+            params.set('daily', this.daily);
+        }
+
+        try {
+            const response = await fetch(`/game/leaderboard?${params}`);
+            const data = await response.json();
+            if (!data.success) {
+                return;
+            }
+
+            const list = document.getElementById('leaderboard');
+            list.innerHTML = '';
+            data.entries.forEach(entry => {
+                const item = document.createElement('li');
+                item.textContent = `${entry.name} ${this.formatTime(entry.time_ms)}`;
+                list.appendChild(item);
+            });
+            document.getElementById('my-rank').textContent = data.me
+                ? `あなた: ${data.me.rank}位 / ${data.total}人 (${this.formatTime(data.me.time_ms)})`
+                : `${data.total}人が挑戦`;
+        } catch (error) {
+            // ランキングが取れなくてもゲームは続けられる
+        }
+    }
+
     showMessage(text, type) {
         const messageElement = document.getElementById('message');
         messageElement.textContent = text;
@@ -307,6 +738,16 @@ class SudokuWebApp {
     }
 }
 
+// サーバーに要求する盤面の表現（json / string / packed）
+SudokuWebApp.BOARD_ENCODING = 'packed';
+
+// 何手ごと・何ミリ秒ごとにサーバーへ盤面を同期するか
+SudokuWebApp.SYNC_EVERY_MOVES = 10;
+SudokuWebApp.SYNC_INTERVAL_MS = 15000;
+
+// 混み合っている（503）ときに新しいゲームを再試行する回数
+SudokuWebApp.MAX_BUSY_RETRIES = 5;
+
 // ページ読み込み後にアプリを初期化
 document.addEventListener('DOMContentLoaded', () => {
     new SudokuWebApp();
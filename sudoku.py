@@ -1,30 +1,607 @@
 import random
 import copy
+import base64
+import hashlib
+import time
+from functools import lru_cache
+from itertools import combinations, permutations
+
+
+_DIGIT_CHARS = bytes.maketrans(bytes(range(10)), b'0123456789')
+
+
+def board_to_string(board):
+    """盤面を81文字の数字列に変換（空欄は0）"""
+    return b''.join(map(bytes, board)).translate(_DIGIT_CHARS).decode()
+
+
+def string_to_board(text):
+    """81文字の数字列を盤面に戻す（空欄は0または.）"""
+    if len(text) != 81:
+        raise ValueError("盤面は81文字で指定してください")
+    cells = [0 if ch == '.' else int(ch) for ch in text]
+    return [cells[i:i + 9] for i in range(0, 81, 9)]
+
+
+def pack_board(board):
+    """盤面を1マス4ビットに詰めてbase64にする（56文字）"""
+    # 数字列は16進数としてそのまま読めるので、bytes.fromhexで2マスずつ1バイトになる
+    return base64.b64encode(bytes.fromhex(board_to_string(board) + '0')).decode()
+
+
+def unpack_board(text):
+    """pack_boardで詰めた盤面を元に戻す"""
+    packed = base64.b64decode(text)
+    if len(packed) != 41:
+        raise ValueError("盤面のデータ長が正しくありません")
+    digits = packed.hex()[:81]
+    if not digits.isdigit():
+        raise ValueError("盤面の数字は0-9で指定してください")
+    return string_to_board(digits)
+
+
+# 通信用の盤面の表現
+BOARD_ENCODINGS = {
+    "json": lambda board: board,    # 9x9のリスト
+    "string": board_to_string,      # 81文字の数字列
+    "packed": pack_board            # 4ビットずつ詰めたbase64
+}
+
+
+def encode_board(board, encoding="json"):
+    """盤面を指定した表現に変換"""
+    return BOARD_ENCODINGS[encoding](board)
+
+
+def parse_board(value):
+    """81文字の文字列・詰めた盤面（56文字）・9x9のリストを盤面として読み込む"""
+    if isinstance(value, str):
+        value = value.strip()
+        if len(value) == 56:
+            return unpack_board(value)
+        if len(value) != 81 or any(ch not in '.0123456789' for ch in value):
+            raise ValueError("盤面は0-9または.の81文字で指定してください")
+        return string_to_board(value)
+
+    if (not isinstance(value, list) or len(value) != 9
+            or any(not isinstance(row, list) or len(row) != 9 for row in value)):
+        raise ValueError("盤面は9x9で指定してください")
+    board = [[int(num) for num in row] for row in value]
+    if any(not 0 <= num <= 9 for row in board for num in row):
+        raise ValueError("盤面の数字は0-9で指定してください")
+    return board
+
+
+# ビットマスク版ソルバー用の表（モジュール読み込み時に1度だけ作る）
+ALL_DIGITS = 0x1FF
+UNITS = ([[r * 9 + c for c in range(9)] for r in range(9)] +
+         [[r * 9 + c for r in range(9)] for c in range(9)] +
+         [[(br + r) * 9 + bc + c for r in range(3) for c in range(3)]
+          for br in (0, 3, 6) for bc in (0, 3, 6)])
+CELL_UNITS = [tuple(u for u, unit in enumerate(UNITS) if cell in unit) for cell in range(81)]
+DIGIT_OF_BIT = {1 << (d - 1): d for d in range(1, 10)}
+
+# 変則ルールで追加されるグループ
+DIAGONAL_UNITS = [[i * 9 + i for i in range(9)], [i * 9 + 8 - i for i in range(9)]]
+HYPER_UNITS = [[(br + r) * 9 + bc + c for r in range(3) for c in range(3)]
+               for br in (1, 5) for bc in (1, 5)]
+
+
+@lru_cache(maxsize=4096)
+def cage_digits(size, total, used):
+    """ケージの空いているマスに入りうる数字（usedはケージに入っている数字のマスク）"""
+    remaining = size - bin(used).count('1')
+    target = total - sum(d for d in range(1, 10) if used & (1 << (d - 1)))
+    if remaining <= 0:
+        return 0
+    digits = 0
+    for combo in combinations([d for d in range(1, 10) if not used & (1 << (d - 1))], remaining):
+        if sum(combo) == target:
+            for d in combo:
+                digits |= 1 << (d - 1)
+    return digits
+
+
+class Variant:
+    """ルール（同じ数字を入れられないグループの集まり）
+
+    行・列・ボックスに、対角線やハイパー（窓）のグループ、キラーのケージを加えたものです。
+    マスごとに属するグループと、同じグループに属するマス（ピア）を前もって求めておくので、
+    1手の検証はピアの数だけで済みます。ケージは合計（total）の条件も持ちます。
+    """
+
+    def __init__(self, name="classic", extra_units=(), cages=()):
+        self.name = name
+        self.cages = [(total, tuple(cells)) for total, cells in cages]
+        self.units = [list(unit) for unit in UNITS] + [list(unit) for unit in extra_units]
+        cage_start = len(self.units)
+        self.units += [list(cells) for _, cells in self.cages]
+
+        # 9マスのグループだけが「1-9が1つずつ入る」ので、隠れたシングルはこれだけで探す
+        self.full_units = [u for u, unit in enumerate(self.units) if len(unit) == 9]
+        self.cell_units = [tuple(u for u, unit in enumerate(self.units) if cell in unit)
+                           for cell in range(81)]
+        self.cell_cages = [tuple((cage_start + i, len(cells), total)
+                                 for i, (total, cells) in enumerate(self.cages) if cell in cells)
+                           for cell in range(81)]
+        # 行・列・ボックス（CELL_UNITSと同じ番号）以外のグループ。通常のルールでは全て空
+        self.extra_units = [units[3:] for units in self.cell_units]
+        self.has_extra = [bool(self.extra_units[cell] or self.cell_cages[cell]) for cell in range(81)]
+        self.peers = [tuple(sorted({other for u in self.cell_units[cell] for other in self.units[u]} - {cell}))
+                      for cell in range(81)]
+
+    def is_valid(self, cells, cell, num):
+        """cellにnumを置けるか（ピアとケージの合計だけを調べる）"""
+        for other in self.peers[cell]:
+            if cells[other] == num:
+                return False
+        for u, size, total in self.cell_cages[cell]:
+            used = 0
+            for other in self.units[u]:
+                if other != cell and cells[other]:
+                    used |= 1 << (cells[other] - 1)
+            if not cage_digits(size, total, used) & (1 << (num - 1)):
+                return False
+        return True
+
+    def to_dict(self):
+        """API用の表現（ケージのマスは0始まりの[行, 列]）"""
+        return {
+            'type': self.name,
+            'cages': [{'sum': total, 'cells': [[cell // 9, cell % 9] for cell in cells]}
+                      for total, cells in self.cages]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        cages = [(cage['sum'], [r * 9 + c for r, c in cage['cells']]) for cage in data.get('cages', [])]
+        return make_variant(data.get('type', 'classic'), cages)
+
+
+def make_variant(name="classic", cages=()):
+    """名前（classic / diagonal / hyper / killer）からルールを作る"""
+    if name not in VARIANTS:
+        raise ValueError(f"不明なルールです: {name}")
+    if name == "killer":
+        return Variant(name, cages=cages)
+    return FIXED_VARIANTS[name]
+
+
+VARIANTS = ("classic", "diagonal", "hyper", "killer")
+CLASSIC = Variant()
+# ケージの無いルールは共通なので、モジュール読み込み時に1度だけ作る
+FIXED_VARIANTS = {
+    'classic': CLASSIC,
+    'diagonal': Variant("diagonal", DIAGONAL_UNITS),
+    'hyper': Variant("hyper", HYPER_UNITS),
+}
+
+
+def cage_sum_range(size):
+    """sizeマスのケージ（数字は重ならない）の合計の最小と最大"""
+    return size * (size + 1) // 2, size * (19 - size) // 2
+
+
+def parse_variant(value):
+    """APIで受け取ったルール（名前または{"type", "cages"}）を読み取る"""
+    if value is None:
+        return CLASSIC
+    if isinstance(value, str):
+        if value == "killer":
+            raise ValueError("キラーはケージを指定してください")
+        return make_variant(value)
+    if not isinstance(value, dict):
+        raise ValueError("ルールの指定が正しくありません")
+
+    cages = value.get('cages') or []
+    covered = []
+    for cage in cages:
+        cells = cage.get('cells') if isinstance(cage, dict) else None
+        if (not cells or not isinstance(cells, list) or len(cells) > 9 or not isinstance(cage.get('sum'), int)
+                or any(not isinstance(cell, list) or len(cell) != 2
+                       or any(not isinstance(n, int) or not 0 <= n <= 8 for n in cell) for cell in cells)):
+            raise ValueError("ケージの指定が正しくありません")
+        low, high = cage_sum_range(len(cells))
+        if not low <= cage['sum'] <= high:
+            raise ValueError(f"{len(cells)}マスのケージの合計は{low}から{high}で指定してください")
+        covered.extend(r * 9 + c for r, c in cells)
+    if len(covered) != len(set(covered)):
+        raise ValueError("ケージが重なっています")
+    return Variant.from_dict(value)
+
+
+class BitmaskSolver:
+    """グループごとの使用済み数字をビットマスクで持つ数え上げソルバー
+
+    盤面は81要素のリストで持ち、place/removeで手がかりを1つずつ出し入れできます。
+    同じインスタンスのまま何度もcountを呼べるので、手がかりを1つずつ外して
+    一意性を調べるような処理でも盤面を作り直す必要がありません。
+    グループの表はvariant（省略時は通常のルール）から取ります。
+    """
+
+    def __init__(self, cells, variant=None):
+        self.variant = variant or CLASSIC
+        self.cell_units = self.variant.cell_units
+        self.has_extra = self.variant.has_extra
+        self.cells = [0] * 81
+        self.used = [0] * len(self.variant.units)
+        self.forbidden = [0] * 81
+        self.consistent = True
+        for cell, num in enumerate(cells):
+            if num:
+                if not self.candidates(cell) & (1 << (num - 1)):
+                    self.consistent = False
+                self.place(cell, num)
+
+    @classmethod
+    def from_board(cls, board, variant=None):
+        return cls([num for row in board for num in row], variant)
+
+    def place(self, cell, num):
+        bit = 1 << (num - 1)
+        self.cells[cell] = num
+        for u in self.cell_units[cell]:
+            self.used[u] |= bit
+
+    def remove(self, cell):
+        bit = 1 << (self.cells[cell] - 1)
+        self.cells[cell] = 0
+        for u in self.cell_units[cell]:
+            self.used[u] &= ~bit
+
+    def candidates(self, cell):
+        used = self.used
+        u1, u2, u3 = CELL_UNITS[cell]
+        mask = ALL_DIGITS & ~(used[u1] | used[u2] | used[u3]) & ~self.forbidden[cell]
+        if self.has_extra[cell]:
+            mask = self._extra_candidates(cell, mask)
+        return mask
+
+    def _extra_candidates(self, cell, mask):
+        """変則ルールのグループとケージの合計で候補を絞る"""
+        used = self.used
+        for u in self.variant.extra_units[cell]:
+            mask &= ~used[u]
+        for u, size, total in self.variant.cell_cages[cell]:
+            mask &= cage_digits(size, total, used[u])
+        return mask
+
+    def count(self, limit=2, on_solution=None):
+        """解の個数をlimit個まで数える（on_solutionには見つけた解を渡す）"""
+        if not self.consistent:
+            return 0
+        return self._search(limit, on_solution)
+
+    def _propagate(self, placed):
+        """1つしか入らないマスを埋め続ける（矛盾したらFalse）"""
+        cells = self.cells
+        used = self.used
+        forbidden = self.forbidden
+        has_extra = self.has_extra
+        units = self.variant.units
+        candidates = self.candidates
+
+        progress = True
+        while progress:
+            progress = False
+            # 候補が1つだけのマス
+            for cell in range(81):
+                if cells[cell]:
+                    continue
+                u1, u2, u3 = CELL_UNITS[cell]
+                mask = ALL_DIGITS & ~(used[u1] | used[u2] | used[u3]) & ~forbidden[cell]
+                if has_extra[cell]:
+                    mask = self._extra_candidates(cell, mask)
+                if not mask:
+                    return False
+                if not mask & (mask - 1):
+                    self.place(cell, DIGIT_OF_BIT[mask])
+                    placed.append(cell)
+                    progress = True
+            if progress:
+                continue
+
+            # グループ内で1か所にしか入らない数字
+            for u in self.variant.full_units:
+                unit = units[u]
+                once = twice = 0
+                for cell in unit:
+                    if not cells[cell]:
+                        mask = candidates(cell)
+                        twice |= once & mask
+                        once |= mask
+                needed = ALL_DIGITS & ~used[u]
+                if once != needed:
+                    return False
+                hidden = once & ~twice
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for cell in unit:
+                        if not cells[cell] and candidates(cell) & bit:
+                            self.place(cell, DIGIT_OF_BIT[bit])
+                            placed.append(cell)
+                            break
+                    else:
+                        return False
+                    progress = True
+                if progress:
+                    break
+        return True
+
+    def _best_cell(self):
+        """候補が最も少ない空欄を選ぶ（空欄が無ければ-1）"""
+        cells = self.cells
+        used = self.used
+        forbidden = self.forbidden
+        has_extra = self.has_extra
+        best = -1
+        best_mask = 0
+        best_count = 10
+        for cell in range(81):
+            if cells[cell]:
+                continue
+            u1, u2, u3 = CELL_UNITS[cell]
+            mask = ALL_DIGITS & ~(used[u1] | used[u2] | used[u3]) & ~forbidden[cell]
+            if has_extra[cell]:
+                mask = self._extra_candidates(cell, mask)
+            n = bin(mask).count('1')
+            if n < best_count:
+                best, best_mask, best_count = cell, mask, n
+                if n == 2:
+                    break
+        return best, best_mask
+
+    def _search(self, limit, on_solution):
+        placed = []
+        try:
+            if not self._propagate(placed):
+                return 0
+
+            best, best_mask = self._best_cell()
+            if best < 0:
+                if on_solution is not None:
+                    on_solution(self.cells[:])
+                return 1
+
+            found = 0
+            while best_mask:
+                bit = best_mask & -best_mask
+                best_mask ^= bit
+                self.place(best, DIGIT_OF_BIT[bit])
+                found += self._search(limit - found, on_solution)
+                self.remove(best)
+                if found >= limit:
+                    break
+            return found
+        finally:
+            for cell in reversed(placed):
+                self.remove(cell)
+
+    def random_solution(self, rng=random):
+        """候補をランダムな順に試して解を1つ返す（無ければNone）"""
+        placed = []
+        try:
+            if not self._propagate(placed):
+                return None
+
+            best, best_mask = self._best_cell()
+            if best < 0:
+                return self.cells[:]
+
+            digits = [d for d in range(1, 10) if best_mask & (1 << (d - 1))]
+            rng.shuffle(digits)
+            for num in digits:
+                self.place(best, num)
+                solution = self.random_solution(rng)
+                self.remove(best)
+                if solution is not None:
+                    return solution
+            return None
+        finally:
+            for cell in reversed(placed):
+                self.remove(cell)
+
+    def has_solution_without(self, cell, num):
+        """cellがnum以外になる解があるか調べる"""
+        self.forbidden[cell] |= 1 << (num - 1)
+        try:
+            return self.count(limit=1) > 0
+        finally:
+            self.forbidden[cell] &= ~(1 << (num - 1))
+
+
+def compute_candidates(board, variant=None):
+    """全マスの候補を1回の走査でまとめて求める
+
+    行・列・ボックスの使用済み数字をビットマスクにしてから、空欄ごとに
+    「どこにも使われていない数字」を9ビットのマスク（数字dはビットd-1）で返します。
+    埋まっているマスは0です。変則ルールではグループとケージの合計も考慮します。
+    """
+    if variant is not None and variant is not CLASSIC:
+        solver = BitmaskSolver.from_board(board, variant)
+        return [0 if solver.cells[cell] else solver.candidates(cell) for cell in range(81)]
+
+    rows = [0] * 9
+    cols = [0] * 9
+    boxes = [0] * 9
+    for r in range(9):
+        row = board[r]
+        for c in range(9):
+            num = row[c]
+            if num:
+                bit = 1 << (num - 1)
+                rows[r] |= bit
+                cols[c] |= bit
+                boxes[r // 3 * 3 + c // 3] |= bit
+
+    return [0 if board[r][c] else ALL_DIGITS & ~(rows[r] | cols[c] | boxes[r // 3 * 3 + c // 3])
+            for r in range(9) for c in range(9)]
+
+
+def reduce_to_minimal(complete_board, symmetric=False, rng=random, variant=None, max_removed=81):
+    """解が1つのまま手がかりを減らし、これ以上減らせない問題を作る
+
+    symmetric=Trueのときは点対称な2マスを組にして取り除きます。
+    直前の問題の解が1つなら、新しい解は取り除いたマスのどこかで必ず違う数字に
+    なるので、取り除いたマスだけを調べれば一意性を判定できます。
+    max_removedを指定すると、その数だけ取り除いたところで止めます。
+    """
+    solver = BitmaskSolver.from_board(complete_board, variant)
+    order = list(range(81))
+    rng.shuffle(order)
+
+    done = set()
+    removed_count = 0
+    for cell in order:
+        if cell in done:
+            continue
+        if removed_count >= max_removed:
+            break
+        group = {cell, 80 - cell} if symmetric else {cell}
+        done |= group
+
+        removed = [(c, solver.cells[c]) for c in group]
+        for c, _ in removed:
+            solver.remove(c)
+        if any(solver.has_solution_without(c, num) for c, num in removed):
+            for c, num in removed:
+                solver.place(c, num)
+        else:
+            removed_count += len(removed)
+
+    return [solver.cells[i:i + 9] for i in range(0, 81, 9)]
+
+
+def count_solutions(board, limit=2, variant=None):
+    """解の個数をlimit個まで数える"""
+    return BitmaskSolver.from_board(board, variant).count(limit)
+
+
+def analyze_puzzle(board, limit=2, variant=None):
+    """解の個数・バックボーン・冗長な手がかりを調べる
+
+    バックボーンは全ての解で同じ数字になるマス、冗長な手がかりは
+    取り除いても解の集合が変わらない手がかりです。
+    """
+    solver = BitmaskSolver.from_board(board, variant)
+    clues = [cell for cell in range(81) if solver.cells[cell]]
+
+    solutions = []
+    total = solver.count(limit, solutions.append)
+    result = {
+        'solutions': total,
+        'limit_reached': total >= limit,
+        'clues': len(clues),
+        'backbone': [[0] * 9 for _ in range(9)],
+        'redundant_clues': []
+    }
+    if total == 0:
+        return result
+
+    # 見つけた解どうしで数字が一致するマスだけがバックボーン候補
+    backbone = solutions[0][:]
+    for solution in solutions[1:]:
+        for cell in range(81):
+            if backbone[cell] != solution[cell]:
+                backbone[cell] = 0
+
+    for cell in range(81):
+        num = backbone[cell]
+        if not num or solver.cells[cell]:
+            continue
+        # 別の数字になる解が見つかれば、その解で違うマスもまとめて候補から外す
+        solver.forbidden[cell] |= 1 << (num - 1)
+        solver.count(1, lambda other: [backbone.__setitem__(c, 0)
+                                       for c in range(81) if backbone[c] != other[c]])
+        solver.forbidden[cell] &= ~(1 << (num - 1))
+
+    for cell in range(81):
+        result['backbone'][cell // 9][cell % 9] = backbone[cell]
+
+    for cell in clues:
+        num = solver.cells[cell]
+        solver.remove(cell)
+        if not solver.has_solution_without(cell, num):
+            result['redundant_clues'].append([cell // 9, cell % 9])
+        solver.place(cell, num)
+
+    return result
+
+
+def make_cages(solution, rng=random, min_size=2, max_size=4):
+    """解答の盤面を、上下左右につながり数字が重ならないケージに分ける"""
+    cage_of = [None] * 81
+    order = list(range(81))
+    rng.shuffle(order)
+
+    cages = []
+    for start in order:
+        if cage_of[start] is not None:
+            continue
+        size = rng.randint(min_size, max_size)
+        cells = [start]
+        digits = {solution[start]}
+        cage_of[start] = len(cages)
+        while len(cells) < size:
+            frontier = [n for cell in cells for n in _neighbors(cell)
+                        if cage_of[n] is None and solution[n] not in digits]
+            if not frontier:
+                break
+            cell = rng.choice(frontier)
+            cells.append(cell)
+            digits.add(solution[cell])
+            cage_of[cell] = len(cages)
+        cages.append((sum(solution[cell] for cell in cells), sorted(cells)))
+    return cages
+
+
+def _neighbors(cell):
+    row, col = divmod(cell, 9)
+    if row > 0:
+        yield cell - 9
+    if row < 8:
+        yield cell + 9
+    if col > 0:
+        yield cell - 1
+    if col < 8:
+        yield cell + 1
+
+
+def generate_variant_puzzle(name, cells_to_remove, rng=random, symmetric=False):
+    """変則ルールの問題を作り、(解答, 問題, ルール)を返す
+
+    解答はビットマスクソルバーで候補をランダムな順に試して作ります。
+    キラーは通常の解答からケージを作ります。手がかりは解が1つのまま
+    cells_to_remove個まで取り除きます（symmetric=Trueなら点対称に）。
+    """
+    if name == "killer":
+        solution = BitmaskSolver([0] * 81).random_solution(rng)
+        variant = make_variant(name, make_cages(solution, rng))
+    else:
+        variant = make_variant(name)
+        solution = BitmaskSolver([0] * 81, variant).random_solution(rng)
+
+    complete_board = [solution[i:i + 9] for i in range(0, 81, 9)]
+    puzzle_board = reduce_to_minimal(complete_board, symmetric=symmetric, rng=rng, variant=variant,
+                                     max_removed=cells_to_remove)
+    return complete_board, puzzle_board, variant
 
 
 class SudokuGenerator:
-    def __init__(self):
+    def __init__(self, variant=None):
         self.board = [[0 for _ in range(9)] for _ in range(9)]
+        self.rng = random
+        self.variant = variant or CLASSIC
         
     def is_valid(self, board, row, col, num):
-        """指定した位置に数字を置けるかチェック"""
-        # 行をチェック
-        for x in range(9):
-            if board[row][x] == num:
-                return False
-        
-        # 列をチェック  
-        for x in range(9):
-            if board[x][col] == num:
+        """指定した位置に数字を置けるかチェック（同じグループのマスだけを見る）"""
+        for peer in self.variant.peers[row * 9 + col]:
+            if board[peer // 9][peer % 9] == num:
                 return False
         
-        # 3x3ボックスをチェック
-        start_row = row - row % 3
-        start_col = col - col % 3
-        for i in range(3):
-            for j in range(3):
-                if board[i + start_row][j + start_col] == num:
-                    return False
+        if self.variant.cell_cages[row * 9 + col]:
+            return self.variant.is_valid([n for r in board for n in r], row * 9 + col, num)
         
         return True
     
@@ -49,8 +626,10 @@ class SudokuGenerator:
         # 対角線上の3x3ボックスから埋める
         self.fill_diagonal()
         
-        # 残りを埋める
-        self.solve_board(self.board)
+        # 残りをビットマスクソルバーで埋める（solve_boardより1桁速い）
+        solutions = []
+        BitmaskSolver.from_board(self.board).count(1, solutions.append)
+        self.board = [solutions[0][i:i + 9] for i in range(0, 81, 9)]
         
         return self.board
     
@@ -62,34 +641,235 @@ class SudokuGenerator:
     def fill_box(self, row, col):
         """3x3ボックスをランダムな数字で埋める"""
         numbers = list(range(1, 10))
-        random.shuffle(numbers)
+        self.rng.shuffle(numbers)
         
         for i in range(3):
             for j in range(3):
                 self.board[row + i][col + j] = numbers.pop()
 
 
+@lru_cache(maxsize=None)
+def column_orders():
+    """列の並べ替え（スタックの順番 x スタック内の列の順番 = 1296通り）
+
+    正規形を求めるときにしか使わないので、最初に使うときに作ります。
+    """
+    perms = list(permutations(range(3)))
+    return [tuple(3 * stack + col for stack, inner in zip(stacks, inners) for col in inner)
+            for stacks in perms
+            for inners in ((a, b, c) for a in perms for b in perms for c in perms)]
+
+
+def _transpose(cells):
+    return [cells[c * 9 + r] for r in range(9) for c in range(9)]
+
+
+def canonical_form(board):
+    """全ての対称変換（転置・行/列の入れ替え・数字の付け替え）の中で
+    辞書順最小になる盤面を81文字で返す
+
+    数字は出現順に1から付け直すので、1行目は空欄の並びだけで決まります。
+    まず1行目を最小にする行と列の並びを絞り込み、その後は1行ずつ
+    最小の行を選びながら同点の候補だけを残して探索します。
+    """
+    cells = [num for row in board for num in row]
+    grids = [cells, _transpose(cells)]
+
+    # 1行目: 各スタック内で空欄を前に寄せ、スタックを小さい順に並べたものが最小
+    def first_row_key(grid, row):
+        stacks = sorted(tuple(sorted(1 if grid[row * 9 + 3 * s + c] else 0 for c in range(3)))
+                        for s in range(3))
+        return tuple(bit for stack in stacks for bit in stack)
+
+    starts = [(first_row_key(grid, row), t, row) for t, grid in enumerate(grids) for row in range(9)]
+    best_key = min(key for key, _, _ in starts)
+
+    # 列の中身が同じ並びになる候補は以後の結果も同じなので1つにまとめる
+    signatures = {}
+    states = {}
+    for key, t, row in starts:
+        if key != best_key:
+            continue
+        grid = grids[t]
+        base = row * 9
+        for order in column_orders():
+            if tuple(1 if grid[base + c] else 0 for c in order) != best_key:
+                continue
+            signature = tuple(tuple(grid[c::9]) for c in order)
+            sig_id = signatures.setdefault(signature, len(signatures))
+            labels = [0] * 10
+            next_label = 1
+            for c in order:
+                num = grid[base + c]
+                if num:
+                    labels[num] = next_label
+                    next_label += 1
+            states.setdefault((sig_id, (row,), tuple(labels)), (grid, order, (row,), labels, next_label))
+
+    result = []
+    label = 1
+    for bit in best_key:
+        result.append(label if bit else 0)
+        label += bit
+
+    # 2行目以降: 同じバンドの残りの行、バンドの先頭ではまだ使っていないバンドの行
+    for position in range(1, 9):
+        best_row = None
+        next_states = {}
+        for (sig_id, _, _), (grid, order, rows, labels, next_label) in states.items():
+            if position % 3:
+                band = rows[-1] // 3
+                choices = [r for r in range(3 * band, 3 * band + 3) if r not in rows]
+            else:
+                used_bands = {r // 3 for r in rows}
+                choices = [r for r in range(9) if r // 3 not in used_bands]
+
+            for row in choices:
+                base = row * 9
+                new_labels = labels
+                new_next = next_label
+                values = []
+                for c in order:
+                    num = grid[base + c]
+                    if num and not new_labels[num]:
+                        if new_labels is labels:
+                            new_labels = labels[:]
+                        new_labels[num] = new_next
+                        new_next += 1
+                    values.append(new_labels[num] if num else 0)
+
+                if best_row is not None and values > best_row:
+                    continue
+                if best_row is None or values < best_row:
+                    best_row = values
+                    next_states = {}
+                new_rows = rows + (row,)
+                # 使った行の集合と今のバンドが同じなら、行の順番は以後に影響しない
+                key = (sig_id, tuple(sorted(new_rows)) + (row // 3,), tuple(new_labels))
+                next_states.setdefault(key, (grid, order, new_rows, new_labels, new_next))
+
+        result.extend(best_row)
+        states = next_states
+
+    return ''.join(map(str, result))
+
+
+def canonical_hash(board, variant=None):
+    """対称変換で移り合う盤面に共通のハッシュ（16桁の16進数）
+
+    変則ルールでは行・列の入れ替えでルールが変わってしまうので、
+    ルールと盤面をそのままハッシュします。
+    """
+    if variant is not None and variant is not CLASSIC:
+        key = f"{variant.name}:{board_to_string(board)}:{variant.cages}"
+        return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    return hashlib.blake2b(canonical_form(board).encode(), digest_size=8).hexdigest()
+
+
+class BloomFilter:
+    """出題済みの問題を覚えておくための小さなブルームフィルター
+
+    セッションのCookieに入れられるよう、ビット列をbase64で出し入れできます。
+    """
+
+    def __init__(self, size_bits=2048, hash_count=4, bits=None):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self.bits = bytearray(bits) if bits is not None else bytearray(size_bits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.hash_count).digest()
+        for i in range(self.hash_count):
+            yield int.from_bytes(digest[4 * i:4 * i + 4], 'little') % self.size_bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def to_base64(self):
+        return base64.b64encode(bytes(self.bits)).decode()
+
+    @classmethod
+    def from_base64(cls, text, size_bits=2048, hash_count=4):
+        if not text:
+            return cls(size_bits, hash_count)
+        try:
+            bits = base64.b64decode(text)
+        except ValueError:
+            return cls(size_bits, hash_count)
+        if len(bits) != size_bits // 8:
+            return cls(size_bits, hash_count)
+        return cls(size_bits, hash_count, bits)
+
+
+# 最小問題まで手がかりを減らす難易度（値は点対称にするかどうか）
+MINIMAL_DIFFICULTIES = {
+    "expert": True,     # 点対称のまま最小化
+    "extreme": False    # 対称性なしで最小化
+}
+
+
 class SudokuPuzzle:
     def __init__(self):
         self.generator = SudokuGenerator()
         self.complete_board = None
         self.puzzle_board = None
         self.user_board = None
+        self.version = 0
+        self._candidates = None
+        self.variant = CLASSIC
+        self.difficulty = None
+        self.daily = None
+        self.started_at = None
+        self.solve_time_ms = None
+        self.recorded = False    # ランキングに記録済みか
+        self.validation = 'server'  # 検証モード（solution / hashedは解答を渡している）
+        self.race = None         # 対戦中なら[部屋コード, 選手番号]
+        
+    def create_puzzle(self, difficulty="medium", variant="classic", seed=None):
+        """問題を作成（variantはclassic / diagonal / hyper / killer）
+
+        seedを指定すると同じseedからは同じ問題を作ります（日替わり問題用）。
+        """
+        rng = random.Random(seed) if seed is not None else random
+        self.generator.rng = rng
+        self.difficulty = difficulty
+        self.started_at = time.time()
+        self.solve_time_ms = None
+        self.recorded = False
+        
+        if variant != "classic":
+            # 変則ルールは解が1つになるように手がかりを減らす
+            cells_to_remove = 81 if difficulty in MINIMAL_DIFFICULTIES else self.get_cells_to_remove(difficulty)
+            self.complete_board, self.puzzle_board, self.variant = generate_variant_puzzle(
+                variant, cells_to_remove, rng, symmetric=MINIMAL_DIFFICULTIES.get(difficulty, False))
+            self.user_board = copy.deepcopy(self.puzzle_board)
+            self.version += 1
+            return self.puzzle_board
+        
+        self.variant = CLASSIC
         
-    def create_puzzle(self, difficulty="medium"):
-        """問題を作成"""
         # 完全な盤面を生成
         self.complete_board = self.generator.generate_complete_board()
         
-        # コピーを作成して問題用にする
-        self.puzzle_board = copy.deepcopy(self.complete_board)
-        
-        # 難易度に応じてセルを消去
-        cells_to_remove = self.get_cells_to_remove(difficulty)
-        self.remove_cells(cells_to_remove)
+        if difficulty in MINIMAL_DIFFICULTIES:
+            # 解が1つのまま減らせるだけ減らす
+            self.puzzle_board = reduce_to_minimal(
+                self.complete_board, symmetric=MINIMAL_DIFFICULTIES[difficulty], rng=rng)
+        else:
+            # コピーを作成して問題用にする
+            self.puzzle_board = copy.deepcopy(self.complete_board)
+            
+            # 難易度に応じてセルを消去
+            cells_to_remove = self.get_cells_to_remove(difficulty)
+            self.remove_cells(cells_to_remove, rng)
         
         # ユーザー解答用の盤面を初期化
         self.user_board = copy.deepcopy(self.puzzle_board)
+        self.version += 1
         
         return self.puzzle_board
     
@@ -102,10 +882,10 @@ class SudokuPuzzle:
         }
         return difficulty_levels.get(difficulty, 45)
     
-    def remove_cells(self, cells_to_remove):
+    def remove_cells(self, cells_to_remove, rng=random):
         """指定した数のセルをランダムに消去"""
         positions = [(i, j) for i in range(9) for j in range(9)]
-        random.shuffle(positions)
+        rng.shuffle(positions)
         
         for i in range(cells_to_remove):
             row, col = positions[i]
@@ -146,6 +926,7 @@ class SudokuPuzzle:
                 return False, "このセルは変更できません"
             
             self.user_board[row-1][col-1] = num
+            self.version += 1
             return True, "手が記録されました"
         else:
             return False, "無効な入力です"
@@ -158,10 +939,70 @@ class SudokuPuzzle:
                 return False, "このセルは変更できません"
             
             self.user_board[row-1][col-1] = 0
+            self.version += 1
             return True, "セルがクリアされました"
         else:
             return False, "無効な入力です"
     
+    def sync_user_board(self, board):
+        """クライアント側で進めた盤面をまとめて反映"""
+        if (not isinstance(board, list) or len(board) != 9
+                or any(not isinstance(row, list) or len(row) != 9 for row in board)):
+            return False, "無効な盤面です"
+        
+        new_board = []
+        for i in range(9):
+            new_row = []
+            for j in range(9):
+                num = int(board[i][j])
+                if not 0 <= num <= 9:
+                    return False, "無効な盤面です"
+                # 元の問題で埋められているセルは変更できない
+                if self.puzzle_board[i][j] != 0 and num != self.puzzle_board[i][j]:
+                    return False, "このセルは変更できません"
+                new_row.append(num)
+            new_board.append(new_row)
+        
+        self.user_board = new_board
+        self.version += 1
+        return True, "盤面が同期されました"
+
+    def fresh_copy(self):
+        """同じ問題の新しいゲーム（入力は空の状態から、時間は今から計る）"""
+        puzzle = SudokuPuzzle()
+        puzzle.complete_board = [row[:] for row in self.complete_board]
+        puzzle.puzzle_board = [row[:] for row in self.puzzle_board]
+        puzzle.user_board = [row[:] for row in self.puzzle_board]
+        puzzle.variant = self.variant
+        puzzle.difficulty = self.difficulty
+        puzzle.daily = self.daily
+        puzzle.started_at = time.time()
+        return puzzle
+
+    # 盤面とルールのほかに保存する状態（ランキングに記録し、対戦の進み具合を送るのに必要なもの）
+    STATE_FIELDS = ('difficulty', 'daily', 'started_at', 'solve_time_ms', 'recorded', 'validation', 'race')
+
+    def state_dict(self):
+        """保存用の状態（難易度・日替わりの日付・開始時刻・解答時間・記録済みか・検証モード・対戦部屋）"""
+        return {name: getattr(self, name) for name in self.STATE_FIELDS}
+
+    def restore_state(self, data):
+        """state_dictで保存した状態を戻す"""
+        for name in self.STATE_FIELDS:
+            if name in data:
+                setattr(self, name, data[name])
+
+    def filled_count(self):
+        """問題の空欄のうち入力済みのマスの数"""
+        return sum(1 for i in range(9) for j in range(9)
+                   if self.puzzle_board[i][j] == 0 and self.user_board[i][j] != 0)
+
+    def get_candidates(self):
+        """ユーザー盤面の全マスの候補（ビットマスク）を返す（盤面が変わるまでキャッシュ）"""
+        if self._candidates is None or self._candidates[0] != self.version:
+            self._candidates = (self.version, compute_candidates(self.user_board, self.variant))
+        return self._candidates[1]
+    
     def check_solution(self):
         """解答をチェック"""
         # 空欄があるかチェック
@@ -172,6 +1013,11 @@ class SudokuPuzzle:
         
         # 完全解答と比較
         if self.user_board == self.complete_board:
+            # 最初に正解したときの経過時間を記録
+            if self.solve_time_ms is None and self.started_at is not None:
+                self.solve_time_ms = int((time.time() - self.started_at) * 1000)
+                # 保存先に書き出すように状態の変化として数える
+                self.version += 1
             return True, "正解です！おめでとうございます！"
         else:
             return False, "間違いがあります。再度確認してください。"
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+import hashlib
+
+from app import app
+import loadtest
+
+
+def new_client():
+    """テスト用のクライアントを作成"""
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_new_game_server_mode():
+    """既定のモードでは解答を返さない"""
+    client = new_client()
+    data = client.post('/game/new_game', json={'difficulty': 'easy'}).get_json()
+
+    assert data['success']
+    assert data['validation'] == 'server'
+    assert 'solution' not in data
+    assert 'solution_hashes' not in data
+
+
+def test_new_game_solution_mode():
+    """solutionモードでは完全解答を返す"""
+    client = new_client()
+    data = client.post('/game/new_game', json={'difficulty': 'easy', 'validation': 'solution'}).get_json()
+
+    assert data['success']
+    for i in range(9):
+        for j in range(9):
+            if data['puzzle'][i][j] != 0:
+                assert data['puzzle'][i][j] == data['solution'][i][j]
+
+
+def test_new_game_hashed_mode():
+    """hashedモードではセルごとのソルト付きハッシュを返す"""
+    client = new_client()
+    data = client.post('/game/new_game', json={'difficulty': 'easy', 'validation': 'hashed'}).get_json()
+
+    assert data['success']
+    assert len(data['solution_hashes']) == 81
+    for i in range(9):
+        for j in range(9):
+            num = data['puzzle'][i][j]
+            if num != 0:
+                cell = f"{data['salt']}:{i * 9 + j}:{num}".encode()
+                assert hashlib.sha256(cell).hexdigest()[:16] == data['solution_hashes'][i * 9 + j]
+
+
+def test_sync_board():
+    """クライアントの盤面を同期して最終チェックできる"""
+    client = new_client()
+    data = client.post('/game/new_game', json={'difficulty': 'easy', 'validation': 'solution'}).get_json()
+
+    result = client.post('/game/sync_board', json={'board': data['solution'], 'final': True}).get_json()
+    assert result['success']
+    assert result['is_correct']
+
+    # 問題のセルを書き換える盤面は拒否される
+    tampered = [row[:] for row in data['solution']]
+    for i in range(9):
+        for j in range(9):
+            if data['puzzle'][i][j] != 0:
+                tampered[i][j] = tampered[i][j] % 9 + 1
+                break
+        else:
+            continue
+        break
+    result = client.post('/game/sync_board', json={'board': tampered}).get_json()
+    assert not result['success']
+
+
+def test_load_test_report():
+    """負荷試験ツールがルートごとのレポートを出力する"""
+    report = loadtest.run_load_test(lambda: loadtest.TestClientTransport(app),
+                                    sessions=4, concurrency=2, moves=3, hints=1, seed=1)
+
+    assert report['errors'] == 0
+    assert report['routes']['/game/new_game']['count'] == 4
+    assert report['routes']['/game/check_solution']['count'] == 4
+    assert report['throughput_rps'] > 0
+
+
+def test_new_game_skips_seen_puzzles():
+    """同じセッションには既に出した問題（の対称変換）を出さない"""
+    import app as app_module
+    from sudoku import BloomFilter
+
+    client = new_client()
+    first = client.post('/game/new_game', json={'difficulty': 'easy'}).get_json()
+    assert len(first['puzzle_hash']) == 16
+
+    with client.session_transaction() as sess:
+        assert first['puzzle_hash'] in BloomFilter.from_base64(sess['seen'])
+
+    # 生成される問題を固定して、既出の問題が再生成されることを確認する
+    boards = [first['puzzle'], first['puzzle'], first['puzzle']]
+    original = app_module.SudokuPuzzle.create_puzzle
+    def fake_create_puzzle(self, difficulty="medium", variant="classic"):
+        original(self, difficulty, variant)
+        if boards:
+            self.puzzle_board = boards.pop()
+        return self.puzzle_board
+    app_module.SudokuPuzzle.create_puzzle = fake_create_puzzle
+    try:
+        second = client.post('/game/new_game', json={'difficulty': 'easy'}).get_json()
+    finally:
+        app_module.SudokuPuzzle.create_puzzle = original
+
+    assert not boards
+    assert second['puzzle_hash'] != first['puzzle_hash']
+
+
+def test_board_encoding_negotiation():
+    """クエリパラメーターまたはヘッダーで盤面の表現を選べる"""
+    from sudoku import parse_board
+
+    client = new_client()
+    data = client.post('/game/new_game?encoding=string', json={'difficulty': 'easy'}).get_json()
+    assert data['encoding'] == 'string'
+    assert isinstance(data['puzzle'], str) and len(data['puzzle']) == 81
+
+    puzzle = parse_board(data['puzzle'])
+    row, col = next((i, j) for i in range(9) for j in range(9) if puzzle[i][j] == 0)
+    data = client.post('/game/make_move', json={'row': row, 'col': col, 'num': 4},
+                       headers={'X-Board-Encoding': 'packed'}).get_json()
+    assert data['encoding'] == 'packed'
+    assert len(data['user_board']) == 56
+    assert parse_board(data['user_board'])[row][col] == 4
+
+    # 不明な表現は既定のjsonになる
+    data = client.post('/game/clear_cell?encoding=xml', json={'row': row, 'col': col}).get_json()
+    assert data['encoding'] == 'json'
+    assert data['user_board'][row][col] == 0
+
+    # 同期は文字列の盤面も受け付ける
+    result = client.post('/game/sync_board', json={'board': ''.join(map(str, sum(puzzle, [])))}).get_json()
+    assert result['success']
+
+
+def test_candidates():
+    """空欄ごとの候補をビットマスクで返す"""
+    client = new_client()
+    data = client.post('/game/new_game', json={'difficulty': 'easy', 'validation': 'solution'}).get_json()
+    puzzle, solution = data['puzzle'], data['solution']
+
+    result = client.get('/game/candidates').get_json()
+    assert result['success']
+    masks = result['candidates']
+    for i in range(9):
+        for j in range(9):
+            if puzzle[i][j]:
+                assert masks[i * 9 + j] == 0
+            else:
+                # 正解の数字は必ず候補に含まれる
+                assert masks[i * 9 + j] & (1 << (solution[i][j] - 1))
+
+    row, col = next((i, j) for i in range(9) for j in range(9) if puzzle[i][j] == 0)
+    client.post('/game/make_move', json={'row': row, 'col': col, 'num': solution[row][col]})
+    compact = client.get('/game/candidates?encoding=string').get_json()
+    assert compact['version'] > result['version']
+    assert len(compact['candidates']) == 243
+    assert compact['candidates'][(row * 9 + col) * 3:(row * 9 + col) * 3 + 3] == '000'
+
+
+def test_analyze():
+    """問題の解析APIは文字列と9x9のリストを受け付ける"""
+    client = new_client()
+    puzzle = "000000010400000000020000000000050407008000300001090000300400200050100000000806000"
+
+    data = client.post('/game/analyze', json={'board': puzzle}).get_json()
+    assert data['success']
+    assert data['solutions'] == 1
+    assert data['clues'] == 17
+
+    empty = [[0] * 9 for _ in range(9)]
+    data = client.post('/game/analyze', json={'board': empty, 'limit': 5}).get_json()
+    assert data['solutions'] == 5
+    assert data['limit_reached']
+
+    data = client.post('/game/analyze', json={'board': 'abc'}).get_json()
+    assert not data['success']
+
+
+def test_new_game_variant():
+    """変則ルールのゲームはルールとケージを返し、候補と解析もルールに従う"""
+    client = new_client()
+    data = client.post('/game/new_game', json={'difficulty': 'easy', 'variant': 'killer',
+                                               'validation': 'solution'}).get_json()
+    assert data['success']
+    assert data['variant']['type'] == 'killer'
+    cages = data['variant']['cages']
+    assert sorted(tuple(cell) for cage in cages for cell in cage['cells']) == \
+        [(i, j) for i in range(9) for j in range(9)]
+    for cage in cages:
+        assert sum(data['solution'][r][c] for r, c in cage['cells']) == cage['sum']
+
+    masks = client.get('/game/candidates').get_json()['candidates']
+    for i in range(9):
+        for j in range(9):
+            if not data['puzzle'][i][j]:
+                assert masks[i * 9 + j] & (1 << (data['solution'][i][j] - 1))
+
+    result = client.post('/game/analyze', json={'board': data['puzzle'], 'variant': data['variant']}).get_json()
+    assert result['solutions'] == 1
+
+    data = client.post('/game/new_game', json={'variant': 'diagonal'}).get_json()
+    assert data['variant'] == {'type': 'diagonal', 'cages': []}
+    assert not client.post('/game/new_game', json={'variant': 'unknown'}).get_json()['success']
+
+
+def test_leaderboard():
+    """正解すると解答時間がランキングに載り、自分の順位を取得できる"""
+    import app as app_module
+
+    # 解答を受け取ったゲームは正解してもランキングに載せない
+    client = new_client()
+    data = client.post('/game/new_game', json={'difficulty': 'hard', 'validation': 'solution'}).get_json()
+    result = client.post('/game/sync_board', json={'board': data['solution'], 'final': True}).get_json()
+    assert result['is_correct']
+    assert result['ranks'] == []
+    data = client.post('/game/new_game', json={'difficulty': 'hard', 'validation': 'hashed'}).get_json()
+    with app_module.games.locked(data['game_id']) as puzzle:
+        solution = puzzle.complete_board
+    result = client.post('/game/sync_board', json={'board': solution, 'final': True}).get_json()
+    assert result['is_correct']
+    assert result['ranks'] == []
+
+    data = client.post('/game/new_game', json={'difficulty': 'hard', 'name': 'テスト', 'daily': True}).get_json()
+    assert data['daily']
+    assert 'solution' not in data
+
+    # serverモードの解答はサーバー側の盤面から取る
+    with app_module.games.locked(data['game_id']) as puzzle:
+        solution = puzzle.complete_board
+    result = client.post('/game/sync_board', json={'board': solution, 'final': True}).get_json()
+    assert result['is_correct']
+    assert [r['board'] for r in result['ranks']] == ['hard', f"daily-{data['daily']}-hard"]
+
+    # 2回目の正解は記録しない
+    assert client.post('/game/check_solution').get_json()['ranks'] == []
+
+    board = client.get('/game/leaderboard?difficulty=hard&daily=today').get_json()
+    assert board['success']
+    assert board['total'] >= 1
+    assert board['me']['name'] == 'テスト'
+    assert board['me']['rank'] == result['ranks'][1]['rank']
+
+    # 日替わり問題は誰にでも同じ問題を出す
+    other = new_client().post('/game/new_game', json={'difficulty': 'hard', 'daily': True}).get_json()
+    assert other['puzzle'] == data['puzzle']
+
+    assert not client.get('/game/leaderboard?difficulty=unknown').get_json()['success']
+    assert not client.get('/game/leaderboard?difficulty=hard&daily=x1').get_json()['success']
+
+
+def test_new_game_busy():
+    """生成の待ち行列があふれたら503とRetry-Afterを返す"""
+    import app as app_module
+    from scheduler import GenerationScheduler
+
+    original = app_module.scheduler
+    app_module.scheduler = GenerationScheduler(max_queue=0)
+    try:
+        response = new_client().post('/game/new_game', json={'difficulty': 'easy'})
+    finally:
+        app_module.scheduler = original
+
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['busy']
+
+    client = new_client()
+    assert client.post('/game/new_game', json={'difficulty': 'easy'}).get_json()['success']
+    stats = client.get('/game/generation_stats').get_json()
+    assert stats['success']
+    assert stats['completed'] > 0
+    assert stats['queue_depth'] == 0
+
+
+if __name__ == "__main__":
+    test_new_game_server_mode()
+    test_new_game_solution_mode()
+    test_new_game_hashed_mode()
+    test_sync_board()
+    test_load_test_report()
+    test_new_game_skips_seen_puzzles()
+    test_board_encoding_negotiation()
+    test_candidates()
+    test_analyze()
+    test_new_game_variant()
+    test_leaderboard()
+    test_new_game_busy()
+    print("✓ APIテスト完了")
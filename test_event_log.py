@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import glob
+import json
+import os
+import tempfile
+
+from event_log import EventLog, build_report, read_events
+
+
+def test_events_are_buffered_and_flushed():
+    """log()はキューに積むだけで、flush()で書き込まれる"""
+    with tempfile.TemporaryDirectory() as directory:
+        log = EventLog(directory, flush_interval=60)
+        for n in range(100):
+            log.log('move', game_id='g', num=n % 9 + 1)
+        log.flush()
+
+        events = list(read_events([directory]))
+        assert [e['num'] for e in events] == [n % 9 + 1 for n in range(100)]
+        assert all(e['event'] == 'move' for e in events)
+        log.close()
+
+
+def test_files_are_rotated():
+    """ファイルがmax_file_bytesを超えたら新しいファイルに切り替える"""
+    with tempfile.TemporaryDirectory() as directory:
+        log = EventLog(directory, flush_bytes=1, max_file_bytes=1024)
+        for _ in range(200):
+            log.log('hint', game_id='game')
+        log.close()
+
+        files = glob.glob(os.path.join(directory, 'events-*.jsonl'))
+        assert len(files) > 1
+        assert all(os.path.getsize(name) <= 1024 for name in files)
+        assert len(list(read_events([directory]))) == 200
+
+
+def test_report_by_difficulty():
+    """難易度ごとに正解率と解答時間の分布を集計する"""
+    events = [
+        {'event': 'new_game', 'game_id': 'a', 'difficulty': 'easy', 'ts': 0},
+        {'event': 'new_game', 'game_id': 'b', 'difficulty': 'easy', 'ts': 0},
+        {'event': 'new_game', 'game_id': 'c', 'difficulty': 'hard', 'ts': 0},
+        {'event': 'move', 'game_id': 'a', 'ts': 10},
+        {'event': 'hint', 'game_id': 'a', 'ts': 20},
+        {'event': 'check', 'game_id': 'a', 'correct': False, 'ts': 50},
+        {'event': 'check', 'game_id': 'a', 'correct': True, 'ts': 100},
+        {'event': 'check', 'game_id': 'b', 'correct': True, 'ts': 300},
+        # 開始が記録されていないゲームは数えない
+        {'event': 'check', 'game_id': 'unknown', 'correct': True, 'ts': 5},
+    ]
+    report = build_report(events)
+
+    easy = report['easy']
+    assert easy['started'] == 2
+    assert easy['solved'] == 2
+    assert easy['solve_rate'] == 1.0
+    assert easy['wrong_checks'] == 1
+    assert easy['time_p25_s'] == 100
+    assert easy['time_p90_s'] == 300
+    assert easy['mean_moves'] == 0.5
+    assert easy['mean_hints'] == 0.5
+
+    hard = report['hard']
+    assert hard['started'] == 1
+    assert hard['solved'] == 0
+    assert hard['time_p50_s'] is None
+
+
+def test_files_from_workers_are_merged():
+    """別々のワーカーのファイルにまたがるゲームも時刻順に併合して集計する"""
+    with tempfile.TemporaryDirectory() as directory:
+        # ファイル名の順では解答したワーカーのファイルが先になる
+        with open(os.path.join(directory, 'events-a-solver.jsonl'), 'w') as f:
+            f.write(json.dumps({'event': 'check', 'game_id': 'g', 'correct': True, 'ts': 30}) + '\n')
+        with open(os.path.join(directory, 'events-b-starter.jsonl'), 'w') as f:
+            f.write(json.dumps({'event': 'new_game', 'game_id': 'g', 'difficulty': 'easy', 'ts': 10}) + '\n')
+            f.write(json.dumps({'event': 'move', 'game_id': 'g', 'ts': 20}) + '\n')
+
+        events = list(read_events([directory]))
+        assert [event['ts'] for event in events] == [10, 20, 30]
+        assert build_report(events)['easy']['solved'] == 1
+
+
+def test_synced_moves_are_counted():
+    """クライアント側で検証するゲームの手数は同期で変わったマスの数で数える"""
+    import app as app_module
+
+    with tempfile.TemporaryDirectory() as directory:
+        original = app_module.event_log
+        app_module.event_log = EventLog(directory, flush_interval=60)
+        try:
+            app_module.app.config['TESTING'] = True
+            client = app_module.app.test_client()
+            data = client.post('/game/new_game', json={'difficulty': 'easy', 'validation': 'solution'}).get_json()
+            board = [row[:] for row in data['puzzle']]
+            empty = [(i, j) for i in range(9) for j in range(9) if not board[i][j]]
+            for i, j in empty[:3]:
+                board[i][j] = data['solution'][i][j]
+            assert client.post('/game/sync_board', json={'board': board}).get_json()['success']
+            result = client.post('/game/sync_board', json={'board': data['solution'], 'final': True}).get_json()
+            assert result['is_correct']
+            app_module.event_log.close()
+        finally:
+            app_module.event_log = original
+
+        events = list(read_events([directory]))
+        assert [event['changed'] for event in events if event['event'] == 'sync'] == [3, len(empty) - 3]
+        assert build_report(events)['easy']['mean_moves'] == len(empty)
+
+
+if __name__ == "__main__":
+    test_events_are_buffered_and_flushed()
+    test_files_are_rotated()
+    test_report_by_difficulty()
+    test_files_from_workers_are_merged()
+    test_synced_moves_are_counted()
+    print("✓ イベントログのテスト完了")
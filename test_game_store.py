@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import threading
+import time
+
+from checkpoint import GameCheckpoint
+from game_store import ShardedGameStore
+from sqlite_store import SQLiteGameStore
+from sudoku import SudokuPuzzle
+
+
+class FakeGame:
+    """同時に操作されていないかを記録するダミーのゲーム"""
+
+    def __init__(self):
+        self.moves = 0
+        self.active = 0
+        self.overlaps = 0
+
+    def make_move(self, work_seconds=0.0):
+        self.active += 1
+        if self.active > 1:
+            self.overlaps += 1
+        # I/Oや計算に相当する待ち時間の間に他のスレッドへ切り替わる
+        moves = self.moves
+        time.sleep(work_seconds)
+        self.moves = moves + 1
+        self.active -= 1
+
+
+def run_workers(store, game_ids, threads, ops_per_thread, work_seconds):
+    """スレッドごとに決まったゲームを操作し、経過時間を返す"""
+    def worker(n):
+        game_id = game_ids[n % len(game_ids)]
+        for _ in range(ops_per_thread):
+            with store.locked(game_id) as game:
+                game.make_move(work_seconds)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - start
+
+
+def test_basic_operations():
+    """辞書と同じ操作ができる"""
+    store = ShardedGameStore(shard_count=4)
+    store['a'] = 1
+    assert 'a' in store
+    assert store['a'] == 1
+    assert store.get('b') is None
+    assert len(store) == 1
+
+    with store.locked('a') as game:
+        assert game == 1
+    with store.locked('missing') as game:
+        assert game is None
+    with store.locked(None) as game:
+        assert game is None
+
+    del store['a']
+    assert 'a' not in store
+
+
+def test_same_game_is_serialized():
+    """同じゲームへの同時操作は直列化され、更新が失われない"""
+    store = ShardedGameStore()
+    store['game'] = FakeGame()
+
+    run_workers(store, ['game'], threads=8, ops_per_thread=50, work_seconds=0.0001)
+
+    game = store['game']
+    assert game.moves == 8 * 50
+    assert game.overlaps == 0
+
+
+def test_throughput_scales_with_threads():
+    """別々のゲームへの操作はスレッド数に応じてスループットが伸びる"""
+    ops = 40
+    work = 0.002
+    results = {}
+
+    for threads in (1, 2, 4, 8):
+        store = ShardedGameStore()
+        game_ids = [f"game-{n}" for n in range(threads)]
+        for game_id in game_ids:
+            store[game_id] = FakeGame()
+
+        elapsed = run_workers(store, game_ids, threads, ops, work)
+        results[threads] = threads * ops / elapsed
+        assert all(store[game_id].moves == ops for game_id in game_ids)
+        print(f"スレッド数 {threads}: {results[threads]:.0f} ops/秒")
+
+    # 理想値は8倍。スケジューリングの揺らぎを見込んで半分以上あればよい
+    assert results[8] > results[1] * 4
+
+
+def new_sqlite_store(directory, **kwargs):
+    """一時ディレクトリにSQLiteのゲーム保存領域を作成"""
+    return SQLiteGameStore(os.path.join(directory, 'games.db'), SudokuPuzzle, **kwargs)
+
+
+def empty_cell(puzzle):
+    """最初の空欄の位置を返す"""
+    for i in range(9):
+        for j in range(9):
+            if puzzle.puzzle_board[i][j] == 0:
+                return i, j
+
+
+def test_sqlite_store_survives_restart():
+    """SQLiteに保存したゲームは再起動後も続きから遊べる"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_sqlite_store(directory)
+        puzzle = SudokuPuzzle()
+        puzzle.create_puzzle("easy")
+        store['game'] = puzzle
+
+        row, col = empty_cell(puzzle)
+        with store.locked('game') as game:
+            game.make_move(row + 1, col + 1, 5)
+        store.flush()
+
+        restarted = new_sqlite_store(directory)
+        with restarted.locked('game') as game:
+            assert game.user_board[row][col] == 5
+            assert game.puzzle_board == puzzle.puzzle_board
+            assert game.complete_board == puzzle.complete_board
+        assert len(restarted) == 1
+
+
+def test_sqlite_store_shared_between_workers():
+    """別のワーカーが書き込んだ手を読み直す"""
+    with tempfile.TemporaryDirectory() as directory:
+        worker_a = new_sqlite_store(directory)
+        worker_b = new_sqlite_store(directory)
+        puzzle = SudokuPuzzle()
+        puzzle.create_puzzle("easy")
+        worker_a['game'] = puzzle
+        row, col = empty_cell(puzzle)
+
+        with worker_b.locked('game') as game:
+            assert game.user_board[row][col] == 0
+
+        with worker_a.locked('game') as game:
+            game.make_move(row + 1, col + 1, 7)
+        worker_a.flush()
+
+        with worker_b.locked('game') as game:
+            assert game.user_board[row][col] == 7
+        assert 'game' in worker_b
+        assert 'missing' not in worker_b
+
+
+def test_sqlite_store_keeps_variant():
+    """変則ルールのゲームは別のワーカーでもルールとケージを保ったまま読み込む"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_sqlite_store(directory)
+        puzzle = SudokuPuzzle()
+        puzzle.create_puzzle("easy", "killer")
+        store['game'] = puzzle
+
+        with new_sqlite_store(directory).locked('game') as game:
+            assert game.variant.name == 'killer'
+            assert game.variant.to_dict() == puzzle.variant.to_dict()
+            assert game.get_candidates() == puzzle.get_candidates()
+
+
+def test_sqlite_store_concurrent_writes_converge():
+    """2つのワーカーが同じゲームに同時に手を打っても、どちらの手も失われない"""
+    with tempfile.TemporaryDirectory() as directory:
+        worker_a = new_sqlite_store(directory, flush_interval=60)
+        worker_b = new_sqlite_store(directory, flush_interval=60)
+        puzzle = SudokuPuzzle()
+        puzzle.create_puzzle("easy")
+        worker_a['game'] = puzzle
+        first, second = [(i, j) for i in range(9) for j in range(9) if puzzle.puzzle_board[i][j] == 0][:2]
+
+        # 両方のワーカーが同じバージョンの盤面をもとに手を打つ
+        with worker_b.locked('game') as game:
+            pass
+        with worker_a.locked('game') as game:
+            game.make_move(first[0] + 1, first[1] + 1, 5)
+        with worker_b.locked('game') as game:
+            game.make_move(second[0] + 1, second[1] + 1, 6)
+        worker_a.flush()
+        worker_b.flush()
+
+        for worker in (worker_a, worker_b, new_sqlite_store(directory)):
+            with worker.locked('game') as game:
+                assert game.user_board[first[0]][first[1]] == 5
+                assert game.user_board[second[0]][second[1]] == 6
+
+        # その後の手も両方のワーカーに届く
+        with worker_a.locked('game') as game:
+            game.clear_cell(second[0] + 1, second[1] + 1)
+        worker_a.flush()
+        with worker_b.locked('game') as game:
+            assert game.user_board[second[0]][second[1]] == 0
+            assert game.user_board[first[0]][first[1]] == 5
+
+
+def test_sqlite_store_connection_pool():
+    """接続はpool_size本までを使い回す"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_sqlite_store(directory, pool_size=2)
+        puzzle = SudokuPuzzle()
+        puzzle.create_puzzle("easy")
+        store['game'] = puzzle
+
+        def worker():
+            for _ in range(20):
+                assert 'game' in store
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert store._pool_created <= 2
+
+
+def test_sqlite_store_write_behind_latency():
+    """手の反映はメモリ上で行い、書き込みはまとめて行う"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_sqlite_store(directory, flush_interval=0.05)
+        puzzle = SudokuPuzzle()
+        puzzle.create_puzzle("easy")
+        store['game'] = puzzle
+        row, col = empty_cell(puzzle)
+
+        moves = 200
+        start = time.perf_counter()
+        for n in range(moves):
+            with store.locked('game') as game:
+                game.make_move(row + 1, col + 1, n % 9 + 1)
+        per_move = (time.perf_counter() - start) / moves
+        print(f"1手あたり: {per_move * 1000:.3f}ミリ秒")
+
+        store.flush()
+        restarted = new_sqlite_store(directory)
+        assert restarted['game'].user_board[row][col] == (moves - 1) % 9 + 1
+        assert per_move < 0.001
+
+
+def new_checkpointed_store(directory):
+    """スナップショット付きのメモリ上のゲーム保存領域を作成"""
+    checkpoint = GameCheckpoint(os.path.join(directory, 'checkpoint.db'), SudokuPuzzle)
+    return ShardedGameStore(checkpoint=checkpoint, checkpoint_interval=60)
+
+
+def test_checkpoint_writes_only_changed_games():
+    """スナップショットには前回から変更のあったゲームだけを書き出す"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_checkpointed_store(directory)
+        for n in range(10):
+            puzzle = SudokuPuzzle()
+            puzzle.create_puzzle("easy")
+            store[f"game-{n}"] = puzzle
+        assert store.checkpoint_now() == 10
+        assert store.checkpoint_now() == 0
+
+        row, col = empty_cell(store['game-3'])
+        with store.locked('game-3') as game:
+            game.make_move(row + 1, col + 1, 4)
+        with store.locked('game-5') as game:
+            game.check_solution()
+        assert store.checkpoint_now() == 1
+
+        del store['game-7']
+        store.checkpoint_now()
+        assert len(store.checkpoint) == 9
+
+
+def test_checkpoint_restores_lazily():
+    """再起動後は最初にアクセスされたゲームだけを読み込む"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = new_checkpointed_store(directory)
+        puzzle = SudokuPuzzle()
+        puzzle.create_puzzle("medium")
+        store['game'] = puzzle
+        row, col = empty_cell(puzzle)
+        with store.locked('game') as game:
+            game.make_move(row + 1, col + 1, 9)
+        store.checkpoint_now()
+
+        restarted = new_checkpointed_store(directory)
+        assert len(restarted) == 0
+        with restarted.locked('game') as game:
+            assert game.user_board[row][col] == 9
+            assert game.puzzle_board == puzzle.puzzle_board
+            assert game.complete_board == puzzle.complete_board
+        assert len(restarted) == 1
+        with restarted.locked('missing') as game:
+            assert game is None
+
+
+def check_game_state_survives_restart(new_store, save):
+    """難易度・開始時刻などを引き継ぎ、再起動後に解いた記録も書き出される"""
+    store = new_store()
+    puzzle = SudokuPuzzle()
+    puzzle.create_puzzle("easy", "diagonal")
+    puzzle.daily = "2026-01-01"
+    puzzle.validation = 'hashed'
+    puzzle.race = ['ABCDEF', 2]
+    store['game'] = puzzle
+    save(store)
+
+    restarted = new_store()
+    with restarted.locked('game') as game:
+        assert game.state_dict() == puzzle.state_dict()
+        assert game.variant.name == 'diagonal'
+        # 解答を渡したゲームは再起動後もランキングに載せない
+        assert game.validation == 'hashed'
+        # 読み直しても対戦の進み具合を送り続けられる
+        assert game.race == ['ABCDEF', 2]
+        game.user_board = [row[:] for row in game.complete_board]
+        game.version += 1
+    with restarted.locked('game') as game:
+        # 再起動後に解いても解答時間が測れる（ランキングに載せられる）
+        assert game.check_solution()[0]
+        assert game.solve_time_ms is not None
+        game.recorded = True
+    save(restarted)
+
+    with new_store().locked('game') as game:
+        assert game.solve_time_ms is not None
+        assert game.recorded
+
+
+def test_game_state_survives_restart():
+    """スナップショットとSQLiteのどちらでもゲームの状態を引き継ぐ"""
+    with tempfile.TemporaryDirectory() as directory:
+        check_game_state_survives_restart(lambda: new_checkpointed_store(directory),
+                                          lambda store: store.checkpoint_now())
+        check_game_state_survives_restart(lambda: new_sqlite_store(directory), lambda store: store.flush())
+
+
+if __name__ == "__main__":
+    test_basic_operations()
+    test_same_game_is_serialized()
+    test_throughput_scales_with_threads()
+    test_sqlite_store_survives_restart()
+    test_sqlite_store_shared_between_workers()
+    test_sqlite_store_keeps_variant()
+    test_sqlite_store_concurrent_writes_converge()
+    test_sqlite_store_connection_pool()
+    test_sqlite_store_write_behind_latency()
+    test_checkpoint_writes_only_changed_games()
+    test_checkpoint_restores_lazily()
+    test_game_state_survives_restart()
+    print("✓ ゲームストアのストレステスト完了")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import bisect
+import os
+import random
+import tempfile
+
+from leaderboard import Leaderboard, LeaderboardStore, RankedList, SQLiteLeaderboardStore, board_key
+
+
+def test_ranked_list_matches_sorted_list():
+    """挿入・削除・順位・k番目がソート済みリストと一致する"""
+    rng = random.Random(1)
+    ranked = RankedList()
+    ranked.LOAD = 8  # バケットの分割・削除も起きるように小さくする
+    expected = []
+    for _ in range(3000):
+        if expected and rng.random() < 0.3:
+            value = rng.choice(expected)
+            expected.remove(value)
+            ranked.remove(value)
+        else:
+            value = rng.randrange(500)
+            bisect.insort(expected, value)
+            ranked.add(value)
+
+    assert list(ranked) == expected
+    assert len(ranked) == len(expected)
+    for value in range(0, 510, 7):
+        assert ranked.rank(value) == bisect.bisect_left(expected, value)
+    for position in range(0, len(expected), 13):
+        assert ranked[position] == expected[position]
+        assert list(ranked.islice(position, position + 20)) == expected[position:position + 20]
+
+
+def test_leaderboard_ranks_and_persistence():
+    """速い順に並び、同じ時間なら先に解いた方が上。圧縮した形から元に戻せる"""
+    board = Leaderboard()
+    slow = board.add(90000, "ゆっくり")
+    fast = board.add(30000, "はやい")
+    tie = board.add(30000, "同着")
+    board.add(60000, "改行\n入り")
+
+    assert [entry['name'] for entry in board.top(3)] == ["はやい", "同着", "改行入り"]
+    assert board.rank(fast) == 1
+    assert board.rank(tie) == 2
+    assert board.rank(slow) == 4
+    assert board.top(2, start=2)[0] == {'rank': 3, 'name': "改行入り", 'time_ms': 60000}
+
+    restored = Leaderboard.from_bytes(board.to_bytes())
+    assert restored.top(10) == board.top(10)
+    assert restored.rank(slow) == 4
+
+
+def test_leaderboard_store_saves_changed_boards():
+    """記録の増えたランキングだけを保存し、次回は最初に使うときに読み込む"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = LeaderboardStore(directory)
+        store.record(board_key("easy"), 1000, "a")
+        store.record(board_key("easy", daily="2026-01-01"), 2000, "b")
+        assert store.save() == 2
+        assert store.save() == 0
+
+        restarted = LeaderboardStore(directory)
+        entries, total = restarted.top(board_key("easy"))
+        assert total == 1
+        assert entries[0]['name'] == "a"
+        assert restarted.entry("daily-2026-01-01-easy", 0)['time_ms'] == 2000
+
+    # 記録の無いランキングを読んでもメモリに残さない
+    store = LeaderboardStore()
+    for n in range(100):
+        assert store.top(board_key("easy", daily=f"x{n}")) == ([], 0)
+        assert store.entry(board_key("hard", daily=f"x{n}"), 0) is None
+    assert len(store._boards) == 0
+
+    try:
+        board_key("../easy")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_sqlite_leaderboard_is_shared_between_workers():
+    """同じデータベースを使うワーカー同士で記録・順位・自分の記録がそろう"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.db')
+        first, second = SQLiteLeaderboardStore(path), SQLiteLeaderboardStore(path)
+        assert first.top("easy") == ([], 0)
+
+        slow = first.record("easy", 5000, "a")
+        fast = second.record("easy", 1000, "b")
+        middle = first.record("easy", 3000, "c")
+        assert (slow, fast, middle) == ((0, 1, 1), (1, 1, 2), (2, 2, 3))
+
+        for store in (first, second):
+            entries, total = store.top("easy")
+            assert total == 3
+            assert [entry['name'] for entry in entries] == ["b", "c", "a"]
+            assert store.entry("easy", fast[0]) == {'rank': 1, 'name': "b", 'time_ms': 1000}
+            assert store.entry("easy", slow[0])['rank'] == 3
+        assert second.entry("hard", 0) is None
+
+        # 再起動しても記録は残る
+        assert SQLiteLeaderboardStore(path).top("easy", 1)[0][0]['name'] == "b"
+
+
+if __name__ == "__main__":
+    test_ranked_list_matches_sorted_list()
+    test_leaderboard_ranks_and_persistence()
+    test_leaderboard_store_saves_changed_boards()
+    test_sqlite_leaderboard_is_shared_between_workers()
+    print("✓ ランキングのテスト完了")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import os
+import pstats
+import tempfile
+
+from profiler import ProfilerMiddleware, RequestProfiler
+
+
+def load_stats(data):
+    """.prof形式のデータをpstatsで読み込む"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'profile.prof')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return pstats.Stats(path)
+
+
+def fake_environ(path='/game/get_hint', token=None):
+    environ = {'REQUEST_METHOD': 'POST', 'PATH_INFO': path}
+    if token:
+        environ['HTTP_X_PROFILE_TOKEN'] = token
+    return environ
+
+
+def test_ring_buffer_and_selection():
+    """トークンが一致するリクエストだけを計測し、直近capacity件だけを残す"""
+    profiler = RequestProfiler(token='secret', capacity=3, skip_prefixes=('/game/profiles',),
+                               skip_suffixes=('/events',))
+    assert not profiler.wants(fake_environ())
+    # 終わらないストリームは管理者のリクエストでも計測しない
+    assert not profiler.wants(fake_environ('/game/race/ABCDEF/events', token='secret'))
+    assert not profiler.wants(fake_environ(token='wrong'))
+    assert not profiler.wants(fake_environ('/game/profiles', token='secret'))
+    assert profiler.wants(fake_environ(token='secret'))
+
+    for _ in range(5):
+        profile = profiler.start()
+        # 計測中は次の計測を始めない
+        assert profiler.start() is None
+        sum(range(1000))
+        profiler.finish(profile, fake_environ(token='secret'), '200 OK', 0.001)
+
+    listed = profiler.list()
+    assert [entry['id'] for entry in listed] == [5, 4, 3]
+    assert profiler.get(1) is None
+    assert load_stats(profiler.get(5)).total_calls > 0
+
+    # 無作為に選んだリクエストも計測し、トークンが無ければ管理者とはみなさない
+    sampled = RequestProfiler(token='secret', sample_rate=1.0)
+    assert not sampled.is_admin('')
+    assert sampled.wants(fake_environ())
+
+    # トークンが無いと計測結果を取り出せないので、無作為の計測だけでは作れない
+    try:
+        RequestProfiler(sample_rate=1.0)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_profiled_request():
+    """管理者トークン付きのリクエストを計測し、.prof形式でダウンロードできる"""
+    import app as app_module
+
+    profiler = RequestProfiler(token='secret', skip_prefixes=('/game/profiles',))
+    original_profiler, original_wsgi_app = app_module.profiler, app_module.app.wsgi_app
+    app_module.profiler = profiler
+    app_module.app.wsgi_app = ProfilerMiddleware(original_wsgi_app, profiler)
+    try:
+        app_module.app.config['TESTING'] = True
+        client = app_module.app.test_client()
+        response = client.post('/game/new_game', json={'difficulty': 'easy'},
+                               headers={'X-Profile-Token': 'secret'})
+        assert response.get_json()['success']
+        profile_id = int(response.headers['X-Profile-Id'])
+
+        # トークンが無いリクエストは計測しない
+        response = client.post('/game/get_hint')
+        assert 'X-Profile-Id' not in response.headers
+
+        assert client.get('/game/profiles').status_code == 403
+        listed = client.get('/game/profiles', headers={'X-Profile-Token': 'secret'}).get_json()
+        assert [entry['path'] for entry in listed['profiles']] == ['/game/new_game']
+
+        response = client.get(f'/game/profiles/{profile_id}.prof', headers={'X-Profile-Token': 'secret'})
+        assert response.status_code == 200
+        # 生成はリクエストのスレッドで行うので、ソルバーの呼び出しも記録されている
+        functions = {name for _, _, name in load_stats(response.data).stats}
+        assert 'generate' in functions
+        assert 'count' in functions
+    finally:
+        app_module.profiler = original_profiler
+        app_module.app.wsgi_app = original_wsgi_app
+
+    assert app_module.app.test_client().get('/game/profiles').status_code == 404
+
+
+if __name__ == "__main__":
+    test_ring_buffer_and_selection()
+    test_profiled_request()
+    print("✓ プロファイルのテスト完了")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import json
+import threading
+import time
+
+from race import RaceHub
+from sudoku import SudokuPuzzle
+
+
+def make_puzzle():
+    puzzle = SudokuPuzzle()
+    puzzle.create_puzzle("easy")
+    return puzzle
+
+
+def parse_event(payload):
+    """SSEの1イベント分のバイト列からdataのJSONを取り出す"""
+    for line in payload.decode().splitlines():
+        if line.startswith('data: '):
+            return json.loads(line[len('data: '):])
+    return None
+
+
+def test_updates_are_coalesced_per_tick():
+    """tickの間の更新はまとめて1回だけ配信する"""
+    hub = RaceHub(tick=3600)
+    room = hub.create(make_puzzle())
+    first = room.join("A")
+    second = room.join("B")
+    assert hub.publish_all() == 1
+    version = room.version
+
+    for filled in range(1, 21):
+        room.update(first, filled)
+        room.update(second, filled // 2)
+    assert room.version == version
+    assert hub.publish_all() == 1
+    assert room.version == version + 1
+    # 変更が無ければ配信しない
+    assert hub.publish_all() == 0
+
+    state = parse_event(room.payload)
+    assert [p['filled'] for p in state['players']] == [20, 10]
+    room.update(second, room.to_fill, finished_ms=1234)
+    hub.publish_all()
+    state = parse_event(room.payload)
+    assert state['players'][0]['name'] == "B"
+    assert state['players'][0]['finished_ms'] == 1234
+
+
+def test_fan_out_stress():
+    """数百の購読者がいても、配信（状態の変換）の回数はtickの回数で決まる"""
+    hub = RaceHub(tick=0.01, heartbeat=0.5)
+    room = hub.create(make_puzzle(), max_players=4)
+    players = [room.join(f"選手{n}") for n in range(4)]
+    subscribers = 300
+    final = {}
+    errors = []
+
+    def subscribe(index):
+        try:
+            for payload in hub.events(room):
+                if payload.startswith(b':'):
+                    continue
+                state = parse_event(payload)
+                if state['players'] and all(p['finished_ms'] is not None for p in state['players']):
+                    final[index] = state
+                    return
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=subscribe, args=(n,)) for n in range(subscribers)]
+    for thread in threads:
+        thread.start()
+
+    started_publishes = room.publishes
+    started = time.monotonic()
+    updates = 0
+    for filled in range(1, room.to_fill + 1):
+        for player in players:
+            room.update(player, filled)
+            updates += 1
+        if filled % 10 == 0:
+            time.sleep(0.001)
+    for n, player in enumerate(players):
+        room.update(player, room.to_fill, finished_ms=1000 + n)
+        updates += 1
+
+    for thread in threads:
+        thread.join(10)
+    elapsed = time.monotonic() - started
+    assert not errors
+    assert len(final) == subscribers
+    assert all(state['version'] == room.version for state in final.values())
+    assert [p['finished_ms'] for p in final[0]['players']] == [1000, 1001, 1002, 1003]
+    # 変換の回数は更新の数ではなく経過時間（tickの回数）で決まる
+    assert room.publishes - started_publishes <= elapsed / hub.tick + 1
+    assert room.subscribers == 0
+
+
+def test_race_routes():
+    """部屋を作って参加し、手を打つと進み具合がSSEで届く"""
+    import app as app_module
+    from sudoku import parse_board
+
+    app_module.app.config['TESTING'] = True
+    host = app_module.app.test_client()
+    created = host.post('/game/race/create', json={'difficulty': 'easy', 'name': 'ホスト'}).get_json()
+    assert created['success']
+    room_id = created['room']
+
+    guest = app_module.app.test_client()
+    joined = guest.post(f'/game/race/{room_id.lower()}/join', json={'name': 'ゲスト'}).get_json()
+    assert joined['success']
+    assert joined['puzzle'] == created['puzzle']
+    assert joined['player_id'] != created['player_id']
+
+    puzzle = parse_board(created['puzzle'])
+    row, col = next((i, j) for i in range(9) for j in range(9) if puzzle[i][j] == 0)
+    assert guest.post('/game/make_move', json={'row': row, 'col': col, 'num': 5}).get_json()['success']
+    app_module.races.publish_all()
+
+    response = host.get(f'/game/race/{room_id}/events')
+    assert response.mimetype == 'text/event-stream'
+    state = parse_event(next(response.response))
+    response.close()
+    assert {p['name']: p['filled'] for p in state['players']} == {'ホスト': 0, 'ゲスト': 1}
+
+    assert host.get('/game/race/NOROOM/events').status_code == 404
+    assert not guest.post('/game/race/NOROOM/join', json={}).get_json()['success']
+
+
+if __name__ == "__main__":
+    test_updates_are_coalesced_per_tick()
+    test_fan_out_stress()
+    test_race_routes()
+    print("✓ 対戦のテスト完了")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+from scheduler import GenerationBusy, GenerationScheduler
+
+
+def run_in_thread(scheduler, difficulty, func, results, **kwargs):
+    """別スレッドでscheduler.runを呼び、結果（または例外）をresultsに追加する"""
+    def target():
+        try:
+            results.append(scheduler.run(difficulty, func, **kwargs))
+        except GenerationBusy as busy:
+            results.append(busy)
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_cheap_difficulties_run_first():
+    """待ち行列からは優先度の高い（安い）難易度を先に取り出す"""
+    scheduler = GenerationScheduler(workers=1)
+    release = threading.Event()
+    order = []
+    results = []
+
+    threads = [run_in_thread(scheduler, "medium", release.wait, results)]
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+    for difficulty in ("hard", "medium", "easy"):
+        threads.append(run_in_thread(scheduler, difficulty, lambda d=difficulty: order.append(d), results))
+    wait_until(lambda: scheduler.stats()['queue_depth'] == 3)
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == ["easy", "medium", "hard"]
+
+
+def test_per_difficulty_limit():
+    """上限に達した難易度は待たせ、他の難易度は先に進める"""
+    scheduler = GenerationScheduler(workers=3, limits={"extreme": 1})
+    release = threading.Event()
+    results = []
+
+    threads = [run_in_thread(scheduler, "extreme", release.wait, results) for _ in range(2)]
+    wait_until(lambda: scheduler.stats()['by_difficulty'].get('extreme') == {'queued': 1, 'running': 1})
+
+    # extremeが詰まっていてもeasyは空いているワーカーで作られる
+    assert scheduler.run("easy", lambda: "easy", timeout=2) == "easy"
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert scheduler.stats()['completed'] == 3
+
+
+def test_full_queue_is_rejected_quickly():
+    """待ち行列があふれたらすぐにGenerationBusyを返す"""
+    scheduler = GenerationScheduler(workers=1, max_queue=1)
+    release = threading.Event()
+    results = []
+
+    threads = [run_in_thread(scheduler, "hard", release.wait, results)]
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+    threads.append(run_in_thread(scheduler, "hard", lambda: "queued", results))
+    wait_until(lambda: scheduler.stats()['queue_depth'] == 1)
+
+    start = time.perf_counter()
+    try:
+        scheduler.run("easy", lambda: "rejected")
+        assert False
+    except GenerationBusy as busy:
+        assert busy.retry_after >= 1
+    assert time.perf_counter() - start < 0.1
+    assert scheduler.stats()['rejected'] == 1
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert "queued" in results
+
+
+def test_started_jobs_are_not_abandoned():
+    """timeoutを過ぎても始まった生成は結果を返し、始まらなかった依頼だけが混雑になる"""
+    scheduler = GenerationScheduler(workers=1, timeout=0.05)
+    assert scheduler.run("expert", lambda: time.sleep(0.2) or "slow") == "slow"
+
+    release = threading.Event()
+    results = []
+    thread = run_in_thread(scheduler, "expert", release.wait, results)
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+    try:
+        scheduler.run("easy", lambda: "never")
+        assert False
+    except GenerationBusy:
+        pass
+    release.set()
+    thread.join()
+    stats = scheduler.stats()
+    assert stats['timed_out'] == 1
+    assert stats['completed'] == 2
+    assert stats['queue_depth'] == 0
+
+
+def test_seeded_requests_are_coalesced():
+    """同じcoalesce_keyの依頼は1回だけ生成して結果を共有する"""
+    scheduler = GenerationScheduler(workers=1)
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def generate():
+        calls.append(1)
+        release.wait()
+        return "daily"
+
+    threads = [run_in_thread(scheduler, "hard", generate, results, coalesce_key="2026-01-01:hard")
+               for _ in range(5)]
+    wait_until(lambda: scheduler.stats()['coalesced'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["daily"] * 5
+
+
+if __name__ == "__main__":
+    test_cheap_difficulties_run_first()
+    test_per_difficulty_limit()
+    test_full_queue_is_rejected_quickly()
+    test_started_jobs_are_not_abandoned()
+    test_seeded_requests_are_coalesced()
+    print("✓ スケジューラーのテスト完了")
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
-from sudoku import SudokuPuzzle
+from sudoku import (SudokuPuzzle, analyze_puzzle, count_solutions, string_to_board,
+                    canonical_form, canonical_hash, BloomFilter, board_to_string, pack_board,
+                    unpack_board, parse_board, compute_candidates, make_variant, parse_variant,
+                    SudokuGenerator, Variant)
 
 def test_sudoku_functionality():
     """ナンプレの機能をテストする"""
@@ -101,6 +104,277 @@ def test_board_generation_speed():
     print(f"\n平均生成時間: {avg_time:.3f}秒")
     print("✓ パフォーマンステスト完了")
 
+# 17個の手がかりで解が1つに定まる問題
+MINIMAL_17 = "000000010400000000020000000000050407008000300001090000300400200050100000000806000"
+MINIMAL_17_SOLUTION = "693784512487512936125963874932651487568247391741398625319475268856129743274836159"
+
+
+def test_count_solutions():
+    """解の個数を上限まで数える"""
+    puzzle = string_to_board(MINIMAL_17)
+    assert count_solutions(puzzle) == 1
+
+    empty = [[0] * 9 for _ in range(9)]
+    assert count_solutions(empty, limit=10) == 10
+
+    conflict = [row[:] for row in puzzle]
+    conflict[0][0] = 1  # 同じ行に1がある
+    assert count_solutions(conflict) == 0
+
+
+def test_analyze_puzzle():
+    """バックボーンと冗長な手がかりを求める"""
+    import time
+
+    puzzle = string_to_board(MINIMAL_17)
+    start_time = time.time()
+    result = analyze_puzzle(puzzle)
+    print(f"\n17ヒント問題の解析: {(time.time() - start_time) * 1000:.1f}ミリ秒")
+
+    # 解が1つなら全マスがバックボーンで、最小問題なので冗長な手がかりは無い
+    assert result['solutions'] == 1
+    assert all(num != 0 for row in result['backbone'] for num in row)
+    assert result['redundant_clues'] == []
+
+    # 解答のマスを1つ足すとその手がかりは冗長になる
+    row, col = next((i, j) for i in range(9) for j in range(9) if puzzle[i][j] == 0)
+    puzzle[row][col] = result['backbone'][row][col]
+    assert [row, col] in analyze_puzzle(puzzle)['redundant_clues']
+
+    # 完成盤から長方形に並んだ a b / b a の4マスを消すと解が2つになる
+    board = string_to_board(MINIMAL_17_SOLUTION)
+    for row, col in [(3, 5), (3, 8), (4, 5), (4, 8)]:
+        board[row][col] = 0
+    result = analyze_puzzle(board, limit=10)
+    assert result['solutions'] == 2
+    assert not result['limit_reached']
+    assert result['backbone'][3][5] == 0
+    assert sum(1 for row in result['backbone'] for num in row if num == 0) == 4
+    # 残りの手がかりはどれも同じ行の他のマスから決まるので全て冗長
+    assert len(result['redundant_clues']) == 77
+
+
+def test_minimal_difficulties():
+    """エキスパート・エクストリームは解が1つの最小問題になる"""
+    import time
+
+    puzzle = SudokuPuzzle()
+    for difficulty in ["expert", "extreme"]:
+        start_time = time.time()
+        board = puzzle.create_puzzle(difficulty)
+        generation_time = time.time() - start_time
+        print(f"\n{difficulty}: 手がかり{81 - sum(row.count(0) for row in board)}個 {generation_time:.3f}秒")
+
+        result = analyze_puzzle(board)
+        assert result['solutions'] == 1
+        assert generation_time < 1.0
+
+        if difficulty == "expert":
+            # 点対称
+            for i in range(9):
+                for j in range(9):
+                    assert (board[i][j] == 0) == (board[8 - i][8 - j] == 0)
+        else:
+            # どの手がかりも外すと解が1つに定まらない
+            assert result['redundant_clues'] == []
+
+
+def test_streaming_solver():
+    """main.pyのsolve/validateモードは入力順に結果を出力する"""
+    import contextlib
+    import io
+    import os
+    import tempfile
+    from main import main
+
+    puzzles = [MINIMAL_17, "0" * 81, "bad", "1" * 81, MINIMAL_17.replace("0", ".")] * 50
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "puzzles.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(puzzles) + "\n")
+
+        for command, expected in [("solve", [MINIMAL_17_SOLUTION, None, "invalid", "invalid", MINIMAL_17_SOLUTION]),
+                                  ("validate", ["unique", "multiple", "invalid", "invalid", "unique"])]:
+            for workers in ("1", "2"):
+                out = io.StringIO()
+                with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+                    assert main([command, path, "--workers", workers, "--chunk-size", "7", "--window", "2"]) == 0
+                lines = out.getvalue().splitlines()
+                assert len(lines) == len(puzzles)
+                for n, line in enumerate(lines):
+                    if expected[n % 5] is None:
+                        # 空の盤面はどれか1つの解を返す
+                        assert len(line) == 81 and "0" not in line
+                    else:
+                        assert line == expected[n % 5]
+
+
+def transform_board(board, rng):
+    """ランダムな対称変換（転置・行/列の入れ替え・数字の付け替え）をかける"""
+    cells = [num for row in board for num in row]
+    if rng.random() < 0.5:
+        cells = [cells[c * 9 + r] for r in range(9) for c in range(9)]
+    rows = [3 * band + r for band in rng.sample(range(3), 3) for r in rng.sample(range(3), 3)]
+    cols = [3 * stack + c for stack in rng.sample(range(3), 3) for c in rng.sample(range(3), 3)]
+    labels = [0] + rng.sample(range(1, 10), 9)
+    return [[labels[cells[r * 9 + c]] for c in cols] for r in rows]
+
+
+def test_canonical_form():
+    """対称変換で移り合う問題は同じ正規形・ハッシュになる"""
+    import random
+    import time
+
+    rng = random.Random(7)
+    puzzle = SudokuPuzzle()
+    for difficulty in ["easy", "hard", "extreme"]:
+        board = puzzle.create_puzzle(difficulty)
+        start_time = time.time()
+        canonical = canonical_form(board)
+        print(f"\n{difficulty}の正規化: {(time.time() - start_time) * 1000:.1f}ミリ秒")
+
+        assert len(canonical) == 81
+        assert canonical.count("0") == sum(row.count(0) for row in board)
+        for _ in range(5):
+            assert canonical_form(transform_board(board, rng)) == canonical
+        assert canonical_hash(transform_board(board, rng)) == canonical_hash(board)
+
+    # 手がかりを1つ変えると別の問題になる
+    board = string_to_board(MINIMAL_17)
+    other = [row[:] for row in board]
+    other[0][0] = 9
+    assert canonical_hash(board) != canonical_hash(other)
+
+
+def test_bloom_filter():
+    """ブルームフィルターはbase64で保存・復元できる"""
+    seen = BloomFilter()
+    seen.add("abc")
+    restored = BloomFilter.from_base64(seen.to_base64())
+    assert "abc" in restored
+    assert "xyz" not in restored
+    assert "abc" not in BloomFilter.from_base64(None)
+    assert "abc" not in BloomFilter.from_base64("broken")
+
+
+def test_board_encodings():
+    """盤面の文字列表現と4ビット詰めの表現は元に戻せる"""
+    puzzle = SudokuPuzzle()
+    board = puzzle.create_puzzle("medium")
+
+    text = board_to_string(board)
+    assert len(text) == 81
+    assert string_to_board(text) == board
+
+    packed = pack_board(board)
+    assert len(packed) == 56
+    assert unpack_board(packed) == board
+    assert parse_board(packed) == board
+    assert parse_board(text) == board
+
+
+def test_compute_candidates():
+    """全マスの候補はis_validで1つずつ調べた結果と一致する"""
+    import time
+
+    puzzle = SudokuPuzzle()
+    board = puzzle.create_puzzle("hard")
+
+    start_time = time.time()
+    masks = compute_candidates(board)
+    print(f"\n候補の計算: {(time.time() - start_time) * 1000:.3f}ミリ秒")
+
+    for i in range(9):
+        for j in range(9):
+            expected = 0
+            if board[i][j] == 0:
+                for num in range(1, 10):
+                    if puzzle.generator.is_valid(board, i, j, num):
+                        expected |= 1 << (num - 1)
+            assert masks[i * 9 + j] == expected
+
+    # 盤面が変わるまではキャッシュを返し、変わったら計算し直す
+    cached = puzzle.get_candidates()
+    assert puzzle.get_candidates() is cached
+    row, col = next((i, j) for i in range(9) for j in range(9) if board[i][j] == 0)
+    puzzle.make_move(row + 1, col + 1, puzzle.complete_board[row][col])
+    assert puzzle.get_candidates() is not cached
+    assert puzzle.get_candidates()[row * 9 + col] == 0
+
+
+def test_variants():
+    """変則ルールの問題は全てのグループとケージの合計を満たし、解が1つ"""
+    for name in ("diagonal", "hyper", "killer"):
+        puzzle = SudokuPuzzle()
+        board = puzzle.create_puzzle("medium", name)
+        variant = puzzle.variant
+        assert variant.name == name
+
+        cells = [num for row in puzzle.complete_board for num in row]
+        for unit in variant.units:
+            digits = [cells[cell] for cell in unit]
+            assert len(set(digits)) == len(digits)
+        for total, cage in variant.cages:
+            assert sum(cells[cell] for cell in cage) == total
+        assert count_solutions(board, 2, variant) == 1
+
+        # 1手の検証はピアだけを見る
+        generator = SudokuGenerator(variant)
+        for cell in range(81):
+            row, col = divmod(cell, 9)
+            assert generator.is_valid(puzzle.complete_board, row, col, cells[cell])
+            assert not generator.is_valid(puzzle.complete_board, row, col, cells[variant.peers[cell][0]])
+
+        # 候補には正解の数字が含まれる
+        masks = compute_candidates(board, variant)
+        for cell in range(81):
+            if not board[cell // 9][cell % 9]:
+                assert masks[cell] & (1 << (cells[cell] - 1))
+
+    # エキスパートは変則ルールでも点対称
+    puzzle = SudokuPuzzle()
+    board = puzzle.create_puzzle("expert", "diagonal")
+    for cell in range(81):
+        assert bool(board[cell // 9][cell % 9]) == bool(board[(80 - cell) // 9][(80 - cell) % 9])
+
+    # 対角線のマスのピアは対角線の分だけ多い
+    diagonal = make_variant("diagonal")
+    assert len(diagonal.peers[0]) == 20 + 6
+    assert len(diagonal.peers[40]) == 20 + 12
+    assert len(make_variant("classic").peers[40]) == 20
+
+    # ケージの合計で候補が絞られる（2マスで3なら1と2だけ）
+    killer = parse_variant({'type': 'killer', 'cages': [{'sum': 3, 'cells': [[0, 0], [0, 1]]}]})
+    assert compute_candidates([[0] * 9 for _ in range(9)], killer)[0] == 0b11
+    try:
+        parse_variant({'type': 'killer', 'cages': [{'sum': 3, 'cells': [[0, 0]]}, {'sum': 4, 'cells': [[0, 0]]}]})
+        assert False
+    except ValueError:
+        pass
+
+    # 数字の重ならないマス数では作れない合計や、10マス以上のケージは受け付けない
+    for cage in ({'sum': 2, 'cells': [[0, 0], [0, 1]]}, {'sum': 18, 'cells': [[0, 0], [0, 1]]},
+                 {'sum': 45, 'cells': [[0, c] for c in range(9)] + [[1, 0]]}):
+        try:
+            parse_variant({'type': 'killer', 'cages': [cage]})
+            assert False
+        except ValueError:
+            pass
+    assert parse_variant({'type': 'killer', 'cages': [{'sum': 17, 'cells': [[0, 0], [0, 1]]}]}).cages == [(17, (0, 1))]
+
+    # ケージの無いルールは作り直さない
+    assert make_variant("diagonal") is make_variant("diagonal")
+    assert Variant.from_dict({'type': 'hyper', 'cages': []}) is make_variant("hyper")
+
+
 if __name__ == "__main__":
     test_sudoku_functionality()
-    test_board_generation_speed()
\ No newline at end of file
+    test_board_generation_speed()
+    test_count_solutions()
+    test_analyze_puzzle()
+    test_minimal_difficulties()
+    test_streaming_solver()
+    test_canonical_form()
+    test_bloom_filter()
+    test_board_encodings()
+    test_compute_candidates()
\ No newline at end of file